@@ -3,11 +3,16 @@
 
 import uuid
 import logging
-from typing import Any, Optional
+from itertools import chain
+from operator import itemgetter
+from typing import Any, Callable, Optional
 import mysql.connector
 
+# The number of seconds to wait when connecting to the database
+DEFAULT_CONNECTION_TIMEOUT = 60
+
 def connect(user: str=None, password: str=None, host: str=None, database: str=None,
-            logger: logging.Logger=None):
+            logger: logging.Logger=None, compress: bool=False, allow_local_infile: bool=False):
     """
     Arguments:
         user: the name of the database user
@@ -15,6 +20,8 @@ def connect(user: str=None, password: str=None, host: str=None, database: str=No
         host: the database's host
         database: the database to connect to
         logger: the logging instance to use
+        compress: compress the data sent between the client and server
+        allow_local_infile: allow loading data from local files (see load_data_file)
     """
     if not logger:
         # Get a logging instance
@@ -30,7 +37,8 @@ def connect(user: str=None, password: str=None, host: str=None, database: str=No
         logger.addHandler(cur_handler)
 
     new_conn = A2Database(logger)
-    new_conn.connect(user, password, host, database)
+    new_conn.connect(user, password, host, database, compress=compress,
+                     allow_local_infile=allow_local_infile)
     return new_conn
 
 class A2Database:
@@ -38,20 +46,56 @@ class A2Database:
     """
     # Characters to strip out of strings used in SQL statements
     _restricted_chars = ';()"\'%*#.'
+    # Characters that are escaped in data files loaded into the database
+    _load_data_escapes = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r',
+                                        '\0': '\\0'})
 
     def __init__(self, logger: logging.Logger=None):
         """Initialize an instance
         """
         self._conn = None
         self._cursor = None
+        self._prepared_cursor = None
         self._verbose = False
         self._mysql_version = None
         self._epsg = None
         self._logger = logger
+        self._query_cache = {}
+        self._unique_cols = {}
+        self._col_collations = {}
 
     def __del__(self):
         """Handles closing the connection and other cleanup
         """
+        self.close()
+
+    def __enter__(self):
+        """Returns this instance for use as a context manager
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        """Closes the connection when leaving the context
+        Arguments:
+            exc_type: the type of exception raised, if any
+            exc_value: the exception raised, if any
+            traceback: the traceback of the exception, if any
+        Returns:
+            Returns False so that any exceptions are propagated
+        Notes:
+            Uncommitted changes are rolled back when leaving because of an exception
+        """
+        if exc_type is not None and self._conn is not None:
+            self.rollback()
+        self.close()
+        return False
+
+    def close(self) -> None:
+        """Closes the cursors and the connection
+        """
+        if self._prepared_cursor is not None:
+            self._prepared_cursor.close()
+            self._prepared_cursor = None
         if self._cursor is not None:
             self._cursor.reset()
             self._cursor.close()
@@ -60,6 +104,16 @@ class A2Database:
             self._conn.close()
             self._conn = None
 
+    def _get_prepared_cursor(self):
+        """Returns the cursor used for server-side prepared statements
+        Notes:
+            The cursor keeps its statement prepared for as long as the same SQL is executed. It's
+            not reset after executing since that deallocates the statement
+        """
+        if self._prepared_cursor is None:
+            self._prepared_cursor = self._conn.cursor(prepared=True)
+        return self._prepared_cursor
+
     def _geom_col_names(self, num_pairs: int, **kwargs) -> tuple:
         """Finds the X,Y column names from the kwargs
         Arguments:
@@ -114,13 +168,19 @@ class A2Database:
         return str(uuid.uuid4()).replace('-', '')
 
     def connect(self, user: str = None, password: str = None, host: str = None, \
-                 database: str = None):
+                 database: str = None, compress: bool = False, allow_local_infile: bool = False):
         """Performs the actual connection to the database
         Arguments:
             user: the name of the database user
             password: the user's password
             host: the database's host
             database: the database to connect to
+            compress: compress the data sent between the client and server
+            allow_local_infile: allow loading data from local files (see load_data_file)
+        Notes:
+            The connector's C extension is used when it's installed since it's faster than
+            the pure Python implementation. Autocommit is turned off so that changes are only
+            made permanent when commit() is called
         """
         if self._conn is None:
             if self._verbose:
@@ -135,7 +195,12 @@ class A2Database:
                                     host=host,
                                     database=database,
                                     password=password,
-                                    user=user
+                                    user=user,
+                                    use_pure=not mysql.connector.HAVE_CEXT,
+                                    compress=compress,
+                                    allow_local_infile=allow_local_infile,
+                                    autocommit=False,
+                                    connection_timeout=DEFAULT_CONNECTION_TIMEOUT
                                     )
             self._cursor = self._conn.cursor()
 
@@ -146,6 +211,24 @@ class A2Database:
                 self._mysql_version = list(int(ver) for ver in cur_row[0].split('-')[0].split('.'))
             self._cursor.reset()
 
+    @staticmethod
+    def values_getter(value_indexes: tuple) -> Callable:
+        """Returns a function that returns the values at the indexes of a row as a tuple
+        Arguments:
+            value_indexes: the indexes of the values to return
+        Returns:
+            Returns the function that takes a row and returns the tuple of values
+        Notes:
+            The function is an itemgetter so the values are gathered without a Python loop
+        """
+        if not value_indexes:
+            return lambda one_row: tuple()
+        if len(value_indexes) == 1:
+            # itemgetter() returns a value instead of a tuple when there's only one index
+            value_index = value_indexes[0]
+            return lambda one_row: (one_row[value_index],)
+        return itemgetter(*value_indexes)
+
     @staticmethod
     def _sqlstr(string: str) -> str:
         """Returns a string stripped of all restricted characters
@@ -375,6 +458,12 @@ class A2Database:
             self._logger.info('Committing to the database')
         self._conn.commit()
 
+    def rollback(self):
+        """Discards the uncommitted changes to the database"""
+        if self._verbose:
+            self._logger.info('Rolling back uncommitted changes to the database')
+        self._conn.rollback()
+
     def reset(self):
         """Resets (clears) the current query"""
         if self._verbose:
@@ -413,6 +502,148 @@ class A2Database:
 
         return False
 
+    def _get_col_collation(self, table_name: str, col_name: str, verbose: bool=None) -> tuple:
+        """Returns the character set and collation of a column
+        Arguments:
+            table_name: the name of the table the column is in
+            col_name: the name of the column
+            verbose: override default for printing query information (prints if True)
+        Returns:
+            Returns a tuple of the character set and collation names, which are None when the
+            column doesn't hold text
+        Notes:
+            The result is cached for each table and column
+        """
+        cache_key = (table_name.lower(), col_name.lower())
+        if cache_key in self._col_collations:
+            return self._col_collations[cache_key]
+
+        if verbose is None:
+            verbose = self._verbose
+
+        query = 'SELECT character_set_name, collation_name FROM INFORMATION_SCHEMA.COLUMNS ' \
+                'WHERE table_schema = %s AND table_name = %s AND column_name = %s'
+        query_values = (self._conn.database, A2Database._sqlstr(table_name),
+                        A2Database._sqlstr(col_name))
+
+        if verbose:
+            self._logger.info(f'{query} {query_values}')
+
+        self._cursor.execute(query, query_values)
+
+        res = self._cursor.fetchone()
+        self._cursor.reset()
+
+        self._col_collations[cache_key] = (res[0], res[1]) if res and res[1] else (None, None)
+        return self._col_collations[cache_key]
+
+    def match_col_values(self, table_name: str, col_name: str, values: tuple,
+                         check_table: bool=True, verbose: bool=None) -> tuple:
+        """Finds which values are already in a column of a table, and which values are the same
+           as an earlier value
+        Arguments:
+            table_name: the table to look in
+            col_name: the name of the column to match the values against
+            values: the values to look for
+            check_table: set to False to only match the values against each other, such as when
+                         the table is known to be empty
+            verbose: override default for printing query information (prints if True)
+        Return:
+            Returns a tuple with an entry for each value. Each entry is a tuple of whether the
+            value is in the column (always False when the table isn't checked), and the index of
+            the first value that's the same as this value (which is the value's own index when
+            there isn't an earlier one)
+        Notes:
+            The database compares the values the way it compares the column's values, so that
+            case, accents, trailing spaces, and type conversions are handled by the column's
+            collation and type. The first index of each value is found by grouping the values
+            once, and the table is only searched for each value's match
+        """
+        if not values:
+            return tuple()
+
+        if verbose is None:
+            verbose = self._verbose
+
+        query_key = ('match', table_name, col_name, len(values), check_table)
+        query = self._query_cache.get(query_key)
+        if query is None:
+            charset, collation = self._get_col_collation(table_name, col_name, verbose)
+            clean_table = A2Database._sqlstr(table_name)
+            clean_col = A2Database._sqlstr(col_name)
+
+            # The values are numbered so that they're returned as they were passed in
+            values_sql = ' UNION ALL '.join(('SELECT 0 AS idx, %s AS val',) + \
+                                            tuple(f'SELECT {idx}, %s' for idx in \
+                                                                    range(1, len(values))))
+            if collation:
+                charset = A2Database._sqlstr(charset)
+                collation = A2Database._sqlstr(collation)
+                match_val = f'CONVERT(v.val USING {charset}) COLLATE {collation}'
+                batch_val = f'CONVERT(w.val USING {charset}) COLLATE {collation}'
+            else:
+                match_val = 'v.val'
+                batch_val = 'w.val'
+
+            if check_table:
+                exists_sql = f'EXISTS(SELECT 1 FROM {clean_table} WHERE ' \
+                             f'`{clean_col}` = {match_val})'
+            else:
+                exists_sql = '0'
+
+            query = f'SELECT v.idx, {exists_sql}, f.first_idx FROM ({values_sql}) AS v ' \
+                    f'LEFT JOIN (SELECT {batch_val} AS val, MIN(w.idx) AS first_idx FROM ' \
+                    f'({values_sql}) AS w GROUP BY 1) AS f ON f.val = {match_val}'
+            self._query_cache[query_key] = query
+
+        query_values = tuple(values) + tuple(values)
+        if verbose is True:
+            self._logger.info(f'{query} {query_values}')
+
+        self._cursor.execute(query, query_values)
+        res = self._cursor.fetchall()
+        self._cursor.reset()
+
+        matches = [None] * len(values)
+        for idx, found, first_idx in res:
+            idx = int(idx)
+            matches[idx] = (bool(found), int(first_idx) if first_idx is not None else idx)
+
+        return tuple(matches)
+
+    def split_new_rows(self, table_name: str, primary_key: str, rows: list, primary_key_idx: int,
+                       check_table: bool=True, verbose: bool=None) -> tuple:
+        """Splits a batch of rows into the rows to add and the rows that already exist
+        Arguments:
+            table_name: the table the rows are written to
+            primary_key: the name of the primary key column
+            rows: the list of row values
+            primary_key_idx: the index of the primary key value in each row
+            check_table: set to False when the table is empty so that the rows are only checked
+                         against each other
+            verbose: override default for printing query information (prints if True)
+        Return:
+            Returns a tuple of the list of new rows and the list of existing rows
+        Notes:
+            A row is new when its key isn't in the table and doesn't repeat the key of an earlier
+            row in the batch (see match_col_values). New rows need to be added before existing
+            rows are updated, since an existing row may be for a new row in the batch
+        """
+        key_matches = self.match_col_values(table_name, primary_key,
+                                            tuple(one_row[primary_key_idx] for one_row in rows),
+                                            check_table, verbose)
+
+        new_rows = []
+        existing_rows = []
+        for idx, one_row in enumerate(rows):
+            key_exists, first_idx = key_matches[idx]
+            if not key_exists and first_idx == idx:
+                new_rows.append(one_row)
+            else:
+                existing_rows.append(one_row)
+
+        return new_rows, existing_rows
+
     def get_col_info(self, table_name: str, col_names: tuple, geometry_epsg: int, **kwargs) \
                      -> tuple:
         """Returns alias information on the columns in the specified table and a found
@@ -527,6 +758,63 @@ class A2Database:
 
         return self._cursor.rowcount > 0
 
+    def col_is_unique(self, table_name: str, col_name: str, verbose: bool=None) -> bool:
+        """Returns whether the column has a unique index of its own, such as a single column
+           primary key
+        Arguments:
+            table_name: the name of the table the column is in
+            col_name: the name of the column to check
+            verbose: override default for printing query information (prints if True)
+        Returns:
+            Returns True if the column's values are unique and False if not
+        Notes:
+            The result is cached for each table and column
+        """
+        cache_key = (table_name.lower(), col_name.lower())
+        if cache_key in self._unique_cols:
+            return self._unique_cols[cache_key]
+
+        if verbose is None:
+            verbose = self._verbose
+
+        query = 'SELECT index_name FROM INFORMATION_SCHEMA.STATISTICS WHERE ' \
+                'table_schema = %s AND table_name = %s AND non_unique = 0 GROUP BY index_name ' \
+                'HAVING COUNT(*) = 1 AND MAX(column_name) = %s'
+        query_values = (self._conn.database, A2Database._sqlstr(table_name),
+                        A2Database._sqlstr(col_name))
+
+        if verbose:
+            self._logger.info(f'{query} {query_values}')
+
+        self._cursor.execute(query, query_values)
+
+        res = self._cursor.fetchall()
+
+        self._unique_cols[cache_key] = len(res) > 0
+        return self._unique_cols[cache_key]
+
+    def table_is_empty(self, table_name: str, verbose: bool=None) -> bool:
+        """Returns whether the table doesn't have any rows
+        Arguments:
+            table_name: the name of the table to check
+            verbose: override default for printing query information (prints if True)
+        Returns:
+            Returns True if the table has no rows and False if it does
+        """
+        if verbose is None:
+            verbose = self._verbose
+
+        query = f'SELECT 1 FROM {A2Database._sqlstr(table_name)} LIMIT 1'
+
+        if verbose:
+            self._logger.info(query)
+
+        self._cursor.execute(query)
+
+        res = self._cursor.fetchall()
+
+        return len(res) == 0
+
     def table_cols_match(self, table_name: str, col_info: tuple, verbose: bool=None,
                          ignore_missing_cols: bool=None) -> tuple:
         """Determines if the current columns in the database table matches the specification
@@ -1026,57 +1314,28 @@ class A2Database:
         if verbose is None:
             verbose = self._verbose
 
-        table_name = A2Database._sqlstr(table_name)
-
         # Perform parameter checks
         if not len(col_names) == len(col_values):
             raise ValueError('The number of columns doesn\'t match the number of values ' \
-                             f'in table {table_name}')
-        if primary_key and not primary_key in col_names:
-            raise ValueError(f'The primary key name "{primary_key}" is not found in ' \
-                  f'column_names "{col_names}"')
-
-        # Determine what columns we're checking
-        if primary_key:
-            check_cols = (primary_key,)
+                             f'in table {A2Database._sqlstr(table_name)}')
+
+        check_cols, get_values, geom_sql = self._get_check_data_info(table_name, col_names,
+                                                                     col_alias, geom_col_info,
+                                                                     primary_key)
+        query_values = get_values(col_values)
+
+        # The query depends on which of the values are checked for null
+        null_checks = tuple(query_values[idx] is None for idx in range(0, len(check_cols)))
+        query_key = (table_name, check_cols, geom_sql, null_checks)
+        if query_key in self._query_cache:
+            query = self._query_cache[query_key]
         else:
-            if not geom_col_info:
-                check_cols = tuple(one_name for one_name in col_names)
-            else:
-                # Strip out the column names that belong to geometry (for now)
-                check_cols = tuple(one_name for one_name in col_names \
-                                if one_name not in geom_col_info['sheet_cols'])
-
-        # Check for column alias's and make the switch where needed
-        if col_alias:
-            # Check for alias on a column name
-            check_cols = tuple((one_name if not one_name in col_alias else col_alias[one_name] \
-                                                                        for one_name in check_cols))
-
-        # Build up the values to pass
-        query_values = list(col_values[col_names.index(one_name)] for one_name in check_cols)
-
-        # Start building the query
-        query = f'SELECT count(1) FROM {table_name} WHERE '
-        joiner = ''
-        for idx in range(0, len(check_cols)):
-            query += joiner + f'`{A2Database._sqlstr(check_cols[idx])}`'
-            if query_values[idx] is None:
-                query += ' is null'
-            else:
-                query += '=%s'
-            joiner = ' AND '
-
-#            if idx > 18: # 14
-#                query_values = query_values[:idx+1]
-#                break
-
-        # Build up the geometry portion of the query
-        if geom_col_info and not primary_key:
-            query += f' AND `{A2Database._sqlstr(geom_col_info["table_column"])}`=' \
-                     f'{geom_col_info["col_sql"]}'
-            query_values.extend((col_values[col_names.index(one_name)] for one_name in \
-                                                                    geom_col_info['sheet_cols']))
+            query = f'SELECT count(1) FROM {A2Database._sqlstr(table_name)} WHERE ' + \
+                    ' AND '.join((f'{one_col} is null' if is_null else f'{one_col}=%s' \
+                                            for one_col, is_null in zip(check_cols, null_checks)))
+            if geom_sql:
+                query += ' AND ' + geom_sql
+            self._query_cache[query_key] = query
 
         # Remove None's that have been converted to null checks
         query_values = list(one_val for one_val in query_values if one_val is not None)
@@ -1093,34 +1352,94 @@ class A2Database:
 
         return False
 
-    def add_update_data(self, table_name: str, col_names: tuple, col_values: tuple, \
-                        col_alias: dict, geom_col_info: dict=None, \
-                        update: bool=False, primary_key: str=None, verbose: bool=None,
-                        readonly: bool=False) -> None:
-        """Adds or updated data in a table. Caller needs to commit the data after al the data is
-           uploaded
+    def _get_check_data_info(self, table_name: str, col_names: tuple, col_alias: dict, \
+                             geom_col_info: dict, primary_key: str) -> tuple:
+        """Returns the information needed to build the query that checks if data exists
+        Arguments:
+            table_name: the name of the table to check
+            col_names: the names of the column in the table
+            col_alias: alias information on columns (see check_data_exists)
+            geom_col_info: optional information on a geometry column (see check_data_exists)
+            primary_key: optional primary key column name
+        Returns:
+            Returns a tuple containing the quoted names of the columns to check, the function
+            returning the query parameters from the column values (see values_getter), and the
+            SQL comparing the geometry column (or None). The geometry parameters follow the
+            checked column parameters
+        Exceptions:
+            Raises a ValueError if the primary key is not one of the column names
+        Notes:
+            The information is the same for every row checked in a table so it's cached
+        """
+        cache_key = ('check', table_name, tuple(col_names),
+                     tuple(col_alias.items()) if col_alias else None,
+                     (geom_col_info['table_column'], geom_col_info['col_sql'],
+                            tuple(geom_col_info['sheet_cols'])) if geom_col_info else None,
+                     primary_key)
+        if cache_key in self._query_cache:
+            return self._query_cache[cache_key]
+
+        if primary_key and not primary_key in col_names:
+            raise ValueError(f'The primary key name "{primary_key}" is not found in ' \
+                  f'column_names "{col_names}"')
+
+        # Determine what columns we're checking
+        if primary_key:
+            check_names = (primary_key,)
+        elif not geom_col_info:
+            check_names = tuple(col_names)
+        else:
+            # Strip out the column names that belong to geometry (for now)
+            check_names = tuple(one_name for one_name in col_names \
+                                            if one_name not in geom_col_info['sheet_cols'])
+        value_indexes = [col_names.index(one_name) for one_name in check_names]
+
+        # Check for column alias's and make the switch where needed
+        if col_alias:
+            check_names = tuple((one_name if not one_name in col_alias else col_alias[one_name] \
+                                                                    for one_name in check_names))
+        check_cols = tuple(f'`{A2Database._sqlstr(one_name)}`' for one_name in check_names)
+
+        # Build up the geometry portion of the query
+        geom_sql = None
+        if geom_col_info and not primary_key:
+            geom_sql = f'`{A2Database._sqlstr(geom_col_info["table_column"])}`=' \
+                       f'{geom_col_info["col_sql"]}'
+            value_indexes.extend((col_names.index(one_name) for one_name in \
+                                                                    geom_col_info['sheet_cols']))
+
+        self._query_cache[cache_key] = (check_cols,
+                                        A2Database.values_getter(tuple(value_indexes)), geom_sql)
+        return self._query_cache[cache_key]
+
+    def _get_add_update_query(self, table_name: str, col_names: tuple, col_alias: dict, \
+                              geom_col_info: dict, update: bool, primary_key: str, \
+                              upsert: bool=False) -> tuple:
+        """Returns the SQL for adding or updating a row of data along with the order of the
+           column values used by the SQL
         Arguments:
             table_name: the name of the table to add to/update
             col_names: the name of the columns to add/update
-            col_values: the column values to use
             col_alias: alias information on columns consisting of column alias' as keys with
                        database column names as values. e.g.: {'alias': 'column nanme'}
-            geom_col_info: information on the geometry column
+            geom_col_info: information on the geometry column (see add_update_data)
             update: flag indicating whether to update or insert a row of data
             primary_key: the primary key column name to use when updating a record
-            verbose: override default for printing query information (prints if True)
-            readonly: don't execute SQL statements that modify the database
+            upsert: flag indicating that inserted rows that already exist update the existing
+                    row instead (the primary key needs to be unique)
+        Returns:
+            Returns a tuple containing the SQL statement and the function returning the parameters
+            of the statement from the column values (see values_getter)
         Notes:
-            The required key names and value descriptions in geom_col_info are:
-            'col_sql': the SQL fragment representing the geometry including any coordinate system
-                       transformations needed. For example: 'ST_GeomFromText(POINT(%s %s), %s)'
-            'sheet_cols': tuple of column names corresponding to the geometry values found in the
-                          col_names parameter. For example: (point_x, point_y, point_epsg) which
-                          are the X, Y, and EPSG column names for a point
-            'table_column': the geometry column name in the target table
+            The SQL is the same for every row loaded into a table so it's cached
         """
-        if verbose is None:
-            verbose = self._verbose
+        cache_key = (table_name, tuple(col_names),
+                     tuple(col_alias.items()) if col_alias else None,
+                     (geom_col_info['table_column'], geom_col_info['col_sql'],
+                            tuple(geom_col_info['sheet_cols'])) if geom_col_info else None,
+                     update, primary_key, upsert)
+        if cache_key in self._query_cache:
+            return self._query_cache[cache_key]
 
         table_name = A2Database._sqlstr(table_name)
         primary_key = A2Database._sqlstr(primary_key) if primary_key is not None else None
@@ -1131,18 +1450,16 @@ class A2Database:
             query_cols = list((one_name for one_name in col_names if \
                                                 one_name not in geom_col_info['sheet_cols']))
             query_types = list(('%s' for one_name in query_cols))
-            query_values = list((col_values[col_names.index(one_name)] \
-                                    for one_name in query_cols if \
-                                            not one_name in geom_col_info['sheet_cols']))
+            value_indexes = list((col_names.index(one_name) for one_name in query_cols))
             # Adding in geom column
             query_cols.append(geom_col_info['table_column'])
             query_types.append(geom_col_info['col_sql'])
-            query_values.extend((col_values[col_names.index(one_name)] \
+            value_indexes.extend((col_names.index(one_name) \
                                                     for one_name in geom_col_info['sheet_cols']))
         else:
             query_cols = col_names
             query_types = list(('%s' for one_name in query_cols))
-            query_values = list(col_values)
+            value_indexes = list(range(0, len(col_names)))
 
         # Check for alias on a column name
         if col_alias:
@@ -1160,13 +1477,56 @@ class A2Database:
             # Remove the primary key from the regular list of values
             primary_key_index = next((idx for idx in range(0, len(query_cols)) \
                                             if query_cols[idx].lower() == primary_key.lower()))
-            query_values = query_values[:primary_key_index] + query_values[primary_key_index+1:]
-            query_values = list(query_values)+list((col_values[col_names.index(primary_key)],))
+            value_indexes = value_indexes[:primary_key_index] + \
+                                                        value_indexes[primary_key_index+1:]
+            value_indexes.append(col_names.index(primary_key))
         else:
             query = f'INSERT INTO {table_name} (' + \
                         ','.join((f'`{A2Database._sqlstr(one_col)}`' for one_col in query_cols)) + \
                         ') VALUES (' + \
                         ','.join(query_types) + ')'
+            if upsert:
+                query += ' ON DUPLICATE KEY UPDATE ' + \
+                    ', '.join((f'`{A2Database._sqlstr(one_col)}`=' \
+                               f'VALUES(`{A2Database._sqlstr(one_col)}`)' \
+                                    for one_col in query_cols \
+                                        if one_col.lower() != primary_key.lower()))
+
+        self._query_cache[cache_key] = (query, A2Database.values_getter(tuple(value_indexes)))
+        return self._query_cache[cache_key]
+
+    def add_update_data(self, table_name: str, col_names: tuple, col_values: tuple, \
+                        col_alias: dict, geom_col_info: dict=None, \
+                        update: bool=False, primary_key: str=None, verbose: bool=None,
+                        readonly: bool=False) -> None:
+        """Adds or updated data in a table. Caller needs to commit the data after al the data is
+           uploaded
+        Arguments:
+            table_name: the name of the table to add to/update
+            col_names: the name of the columns to add/update
+            col_values: the column values to use
+            col_alias: alias information on columns consisting of column alias' as keys with
+                       database column names as values. e.g.: {'alias': 'column nanme'}
+            geom_col_info: information on the geometry column
+            update: flag indicating whether to update or insert a row of data
+            primary_key: the primary key column name to use when updating a record
+            verbose: override default for printing query information (prints if True)
+            readonly: don't execute SQL statements that modify the database
+        Notes:
+            The required key names and value descriptions in geom_col_info are:
+            'col_sql': the SQL fragment representing the geometry including any coordinate system
+                       transformations needed. For example: 'ST_GeomFromText(POINT(%s %s), %s)'
+            'sheet_cols': tuple of column names corresponding to the geometry values found in the
+                          col_names parameter. For example: (point_x, point_y, point_epsg) which
+                          are the X, Y, and EPSG column names for a point
+            'table_column': the geometry column name in the target table
+        """
+        if verbose is None:
+            verbose = self._verbose
+
+        query, get_values = self._get_add_update_query(table_name, col_names, col_alias,
+                                                       geom_col_info, update, primary_key)
+        query_values = get_values(col_values)
 
         # Run the query
         if verbose:
@@ -1175,3 +1535,167 @@ class A2Database:
         if not readonly:
             self._cursor.execute(query, query_values)
             self._cursor.reset()
+
+    def add_update_data_batch(self, table_name: str, col_names: tuple, rows: list, \
+                              col_alias: dict, geom_col_info: dict=None, \
+                              update: bool=False, primary_key: str=None, verbose: bool=None,
+                              readonly: bool=False) -> int:
+        """Adds or updates multiple rows of data in a table. Caller needs to commit the data after
+           all the data is uploaded
+        Arguments:
+            table_name: the name of the table to add to/update
+            col_names: the name of the columns to add/update
+            rows: a list of the column values for each row (see add_update_data)
+            col_alias: alias information on columns consisting of column alias' as keys with
+                       database column names as values. e.g.: {'alias': 'column nanme'}
+            geom_col_info: information on the geometry column (see add_update_data)
+            update: flag indicating whether to update existing rows or insert new rows
+            primary_key: the primary key column name to use when updating records
+            verbose: override default for printing query information (prints if True)
+            readonly: don't execute SQL statements that modify the database
+        Returns:
+            Returns the number of rows that were added or changed. Updated rows that already had
+            the same values aren't counted
+        Notes:
+            New rows are added with a single multi-row INSERT statement. Updates to a table with
+            a unique primary key are also sent as one INSERT statement with an ON DUPLICATE KEY
+            UPDATE clause. Other updates are run as a server-side prepared statement using
+            executemany() so that the statement is only parsed once
+        """
+        if not rows:
+            return 0
+
+        if verbose is None:
+            verbose = self._verbose
+
+        upsert = update and self.col_is_unique(table_name, primary_key, verbose=verbose)
+        query, get_values = self._get_add_update_query(table_name, col_names, col_alias,
+                                                       geom_col_info, update and not upsert,
+                                                       primary_key, upsert)
+
+        if update and not upsert:
+            query_values = list(map(get_values, rows))
+
+            if verbose:
+                self._logger.info(f'{query} {len(query_values)} rows')
+
+            if readonly:
+                return len(rows)
+            cursor = self._get_prepared_cursor()
+            cursor.executemany(query, query_values)
+            return cursor.rowcount
+
+        # Repeat the row values clause of the INSERT statement for each row. Full batches all
+        # have the same number of rows, so the statement is cached
+        batch_key = (query, len(rows))
+        if batch_key in self._query_cache:
+            batch_query = self._query_cache[batch_key]
+        else:
+            query_start, _, query_row = query.partition(' VALUES ')
+            query_row, query_sep, query_end = query_row.partition(' ON DUPLICATE KEY UPDATE ')
+            batch_query = query_start + ' VALUES ' + \
+                                        ','.join((query_row for _ in range(0, len(rows)))) + \
+                                        query_sep + query_end
+            self._query_cache[batch_key] = batch_query
+        query_values = list(chain.from_iterable(map(get_values, rows)))
+
+        if verbose:
+            self._logger.info(f'{query} ... {len(rows)} rows')
+
+        if readonly:
+            return len(rows)
+        self._cursor.execute(batch_query, query_values)
+        row_count = self._cursor.rowcount
+        self._cursor.reset()
+
+        # The rows being updated already exist and the database counts each changed row twice
+        return row_count // 2 if upsert else row_count
+
+    @staticmethod
+    def load_data_line(col_values: tuple) -> str:
+        """Returns the line representing the values in a data file (see load_data_file)
+        Arguments:
+            col_values: the values to format
+        Returns:
+            Returns the tab separated line of values, including the line ending
+        """
+        return '\t'.join(('\\N' if one_value is None else \
+                            str(int(one_value)) if isinstance(one_value, bool) else \
+                            str(one_value).translate(A2Database._load_data_escapes) \
+                                                                for one_value in col_values)) + '\n'
+
+    def load_data_file(self, table_name: str, col_names: tuple, file_path: str, \
+                       col_alias: dict=None, geom_col_info: dict=None, \
+                       disable_checks: bool=False, replace: bool=False, verbose: bool=None, \
+                       readonly: bool=False) -> int:
+        """Loads the rows in a data file into a table. Caller needs to commit the data after all
+           the data is uploaded
+        Arguments:
+            table_name: the name of the table to load
+            col_names: the names of the columns in the file
+            file_path: the path to the data file with one line per row (see load_data_line)
+            col_alias: alias information on columns consisting of column alias' as keys with
+                       database column names as values. e.g.: {'alias': 'column nanme'}
+            geom_col_info: the geometry column information (see get_col_info)
+            disable_checks: turn off unique and foreign key checks while loading the file
+            replace: replace rows with duplicate keys instead of skipping them
+            verbose: override default for printing query information (prints if True)
+            readonly: don't execute SQL statements that modify the database
+        Returns:
+            Returns the number of rows affected as reported by the database, or 0 when readonly
+        Notes:
+            The connection needs to be made with allow_local_infile set, and the server needs to
+            have local_infile enabled. Rows with duplicate keys are skipped by the server unless
+            replace is set, in which case the last row with a key is kept. Each replaced row is
+            counted twice in the number of affected rows (once for the delete and once for the
+            insert).
+            The geometry point columns are loaded into variables that are used to set the
+            geometry column.
+            Disabling the checks saves the server from checking secondary unique indexes and
+            foreign keys for each row. Primary keys are always checked. The session's previous
+            settings are restored after loading
+        """
+        if verbose is None:
+            verbose = self._verbose
+
+        table_name = A2Database._sqlstr(table_name)
+        geom_sheet_cols = geom_col_info['sheet_cols'] if geom_col_info else ()
+
+        load_cols = []
+        for one_name in col_names:
+            if one_name in geom_sheet_cols:
+                load_cols.append(f'@geom_val_{geom_sheet_cols.index(one_name)}')
+            else:
+                if col_alias and one_name in col_alias:
+                    one_name = col_alias[one_name]
+                load_cols.append(f'`{A2Database._sqlstr(one_name)}`')
+
+        query = 'LOAD DATA LOCAL INFILE %s ' + ('REPLACE ' if replace else '') + \
+                f'INTO TABLE {table_name} CHARACTER SET utf8mb4 ' \
+                'FIELDS TERMINATED BY \'\\t\' ESCAPED BY \'\\\\\' LINES TERMINATED BY \'\\n\' (' + \
+                ','.join(load_cols) + ')'
+        if geom_col_info:
+            geom_sql = geom_col_info['col_sql'] % \
+                            tuple(f'@geom_val_{idx}' for idx in range(len(geom_sheet_cols)))
+            query += f' SET `{A2Database._sqlstr(geom_col_info["table_column"])}` = {geom_sql}'
+
+        if verbose:
+            self._logger.info(f'{query} {file_path}')
+
+        if readonly:
+            return 0
+
+        if disable_checks:
+            self._cursor.execute('SET @OLD_UNIQUE_CHECKS=@@UNIQUE_CHECKS, UNIQUE_CHECKS=0, ' \
+                                 '@OLD_FOREIGN_KEY_CHECKS=@@FOREIGN_KEY_CHECKS, ' \
+                                 'FOREIGN_KEY_CHECKS=0')
+        try:
+            self._cursor.execute(query, (file_path,))
+            affected_rows = self._cursor.rowcount
+            self._cursor.reset()
+        finally:
+            if disable_checks:
+                self._cursor.execute('SET UNIQUE_CHECKS=@OLD_UNIQUE_CHECKS, ' \
+                                     'FOREIGN_KEY_CHECKS=@OLD_FOREIGN_KEY_CHECKS')
+
+        return affected_rows
@@ -7,6 +7,10 @@ import argparse
 import sys
 import logging
 from getpass import getpass
+import threading
+import queue
+import tempfile
+from typing import Any, Callable, Iterator
 import openpyxl
 from openpyxl import load_workbook
 import mysql.connector
@@ -16,13 +20,15 @@ from a2database import A2Database
 
 # Check if we have the geometry transformation module
 try:
-    from osgeo import ogr
     from osgeo import osr
 except ModuleNotFoundError:
     GEOM_CAN_TRANSFORM = False
 else:
     GEOM_CAN_TRANSFORM = True
 
+# The cached coordinate transformations of each thread (see get_transform)
+TRANSFORM_CACHE = threading.local()
+
 # The name of our script
 SCRIPT_NAME = os.path.basename(__file__)
 
@@ -56,6 +62,33 @@ DEFAULT_SCHEMA_DESCRIPTION_COL = 'Description'
 # Default EPSG code for points
 DEFAULT_GEOM_EPSG = 26912
 
+# Default number of rows to write to the database at one time. Kept modest so that the
+# multi-row statements stay well under the server's max_allowed_packet
+DEFAULT_BATCH_SIZE = 1000
+
+# Default number of batches written between commits. Zero only commits once everything is loaded
+DEFAULT_COMMIT_EVERY = 0
+
+# The number of batches of rows read from the sheet ahead of the rows being written
+READ_AHEAD_BATCHES = 4
+
+# Maps the schema column types to their database types. Text types are in TEXT_COL_TYPES
+COL_TYPE_MAP = {
+    'Number': 'DOUBLE',
+    'Double': 'DOUBLE',
+    'Single': 'DOUBLE',
+    'Integer': 'INT',
+    'Long Integer': 'INT',
+    'Date/Time': 'TIMESTAMP',
+    'Date With Time': 'TIMESTAMP',
+    'Time': 'TIME',
+    'Yes/No': 'TINYINT',
+    'POINT': 'POINT'
+}
+
+# The schema column types that are text, and map to a VARCHAR of the column's length
+TEXT_COL_TYPES = frozenset(('Short Text', 'Long Text'))
+
 # Default name for logging output
 DEFAULT_LOG_FILENAME = 'populate_from_excel.out'
 
@@ -156,6 +189,20 @@ ARGPARSE_LOG_FILENAME_HELP = 'Change the name of the file where logging gets sav
                              f'named {DEFAULT_LOG_FILENAME}'
 # Lowering the debug level to DEBUG
 ARGPARSE_LOGGING_DEBUG_HELP = 'Increases the logging level to include debugging messages'
+# Help for compressing the database connection traffic
+ARGPARSE_COMPRESS_HELP = 'Compress the data sent to and from the database (useful when the ' \
+                         'database server is on a slow or remote network)'
+# Help for loading new tables from a data file
+ARGPARSE_LOAD_DATA_HELP = 'Load the data into new or empty tables using a data file. This is ' \
+                          'faster but the database server needs to allow local files to be ' \
+                          'loaded (local_infile)'
+# Help for the number of rows written at one time
+ARGPARSE_BATCH_SIZE_HELP = 'The number of rows to write to the database at one time ' \
+                           f'(default {DEFAULT_BATCH_SIZE} rows)'
+# Help for committing while the rows are written
+ARGPARSE_COMMIT_EVERY_HELP = 'Commit the changes after this many batches of rows are written. ' \
+                             'Changes that were committed are kept if there\'s an error later ' \
+                             'on (default is to only commit after all the data is loaded)'
 
 def get_arguments(logger: logging.Logger) -> tuple:
     """ Returns the data from the parsed command line arguments
@@ -217,6 +264,12 @@ def get_arguments(logger: logging.Logger) -> tuple:
     parser.add_argument('--log_filename', default=DEFAULT_LOG_FILENAME,
                         help=ARGPARSE_LOG_FILENAME_HELP)
     parser.add_argument('--debug', help=ARGPARSE_LOGGING_DEBUG_HELP)
+    parser.add_argument('--compress', action='store_true', help=ARGPARSE_COMPRESS_HELP)
+    parser.add_argument('--load_data', action='store_true', help=ARGPARSE_LOAD_DATA_HELP)
+    parser.add_argument('--batch_size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=ARGPARSE_BATCH_SIZE_HELP)
+    parser.add_argument('--commit_every', type=int, default=DEFAULT_COMMIT_EVERY,
+                        help=ARGPARSE_COMMIT_EVERY_HELP)
     args = parser.parse_args()
 
     # Find the EXCEL file and the password (which is allowed to be eliminated)
@@ -234,10 +287,7 @@ def get_arguments(logger: logging.Logger) -> tuple:
         sys.exit(10)
 
     # Check that we can access the EXCEL file
-    try:
-        with open(excel_file, encoding="utf-8"):
-            pass
-    except FileNotFoundError:
+    if not os.path.isfile(excel_file) or not os.access(excel_file, os.R_OK):
         logger.error(f'Unable to open EXCEL file {excel_file}')
         sys.exit(11)
 
@@ -253,6 +303,16 @@ def get_arguments(logger: logging.Logger) -> tuple:
                 logger.error('Please specify an X and Y column name for point support')
                 sys.exit(13)
 
+    # Check the batch size
+    if args.batch_size < 1:
+        logger.error('The batch size must be a positive number')
+        sys.exit(14)
+
+    # Check the number of batches between commits
+    if args.commit_every < 0:
+        logger.error('The number of batches between commits can\'t be negative')
+        sys.exit(15)
+
     cmd_opts = {'force': args.force,
                 'verbose': args.verbose,
                 'host': args.host,
@@ -272,7 +332,7 @@ def get_arguments(logger: logging.Logger) -> tuple:
                 'schema_data_len_col': args.schema_data_len_col,
                 'schema_description_col': args.schema_description_col,
                 'use_schema_cols': args.use_schema_cols,
-                'ignore_cols': tuple(one_col.casefold() for one_col in args.ignore_col) \
+                'ignore_cols': frozenset(one_col.casefold() for one_col in args.ignore_col) \
                                     if args.ignore_col else None,
                 'point_col_x': args.point_cols.split(',')[0] if args.point_cols else None,
                 'point_col_y': args.point_cols.split(',')[1] if args.point_cols else None,
@@ -283,7 +343,11 @@ def get_arguments(logger: logging.Logger) -> tuple:
                 'no_primary': args.no_primary,
                 'noviews': args.noviews,
                 'log_filename': args.log_filename,
-                'debug': args.debug
+                'debug': args.debug,
+                'compress': args.compress,
+                'batch_size': args.batch_size,
+                'commit_every': args.commit_every,
+                'load_data': args.load_data
                }
 
     # Return the loaded JSON
@@ -317,6 +381,38 @@ def init_logging(filename: str, level: int=logging.INFO) -> logging.Logger:
     return logger
 
 
+def get_transform(from_epsg: int, to_epsg: int) -> tuple:
+    """Returns the coordinate transformation between two coordinate systems
+    Arguments:
+        from_epsg: original EPSG code
+        to_epsg: EPSG code to transform points to
+    Returns:
+        A tuple of the from and to spatial references, and the transformation
+    Notes:
+        Transformations are expensive to create so they are cached. The spatial references
+        aren't thread-safe so each thread has its own cache. The spatial references are
+        returned to keep them alive for as long as the transformation is in use
+    """
+    transforms = getattr(TRANSFORM_CACHE, 'transforms', None)
+    if transforms is None:
+        transforms = TRANSFORM_CACHE.transforms = {}
+
+    cache_key = (from_epsg, to_epsg)
+    if cache_key not in transforms:
+        from_sr = osr.SpatialReference()
+        from_sr.ImportFromEPSG(int(from_epsg))
+        to_sr = osr.SpatialReference()
+        to_sr.ImportFromEPSG(int(to_epsg))
+        # Keep the X,Y (longitude, latitude) order of our values for all coordinate systems
+        if hasattr(osr, 'OAMS_TRADITIONAL_GIS_ORDER'):
+            from_sr.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+            to_sr.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        transforms[cache_key] = (from_sr, to_sr,
+                                 osr.CreateCoordinateTransformation(from_sr, to_sr))
+
+    return transforms[cache_key]
+
+
 def transform_points(from_epsg: int, to_epsg: int, values: tuple) -> list:
     """Returns the list with the last num_values converted to the new coordinate system
     Arguments:
@@ -334,60 +430,108 @@ def transform_points(from_epsg: int, to_epsg: int, values: tuple) -> list:
     if not GEOM_CAN_TRANSFORM:
         raise ValueError('Unable to transform points, supporting osgeo module is not installed')
 
-    # Transform the points
-    return_values = []
-    idx = 0
-    from_sr = osr.SpatialReference()
-    from_sr.ImportFromEPSG(int(from_epsg))
-    to_sr = osr.SpatialReference()
-    to_sr.ImportFromEPSG(int(to_epsg))
-    transform = osr.CreateCoordinateTransformation(from_sr, to_sr)
-    while idx < len(values):
-        cur_geom = ogr.CreateGeometryFromWkt(f'POINT({values[idx]} {values[idx+1]} {from_epsg})')
-        cur_geom.Transform(transform)
-        return_values.extend((cur_geom.GetX(), cur_geom.GetY()))
-        idx = idx + 2
-
-    return return_values
-
-
-def transform_geom_cols(col_names: tuple, col_values: tuple, geom_col_info: dict, from_epsg: int, \
-                        to_epsg: int) -> list:
-    """Transforms geometry point to the specified coordinate system
+    # Transform all the points in one call
+    _, _, transform = get_transform(int(from_epsg), int(to_epsg))
+    new_points = transform.TransformPoints([(float(values[idx]), float(values[idx+1])) \
+                                                        for idx in range(0, len(values), 2)])
+
+    return [one_coord for one_point in new_points for one_coord in one_point[:2]]
+
+
+def geom_col_indexes(col_names: tuple, geom_col_info: dict) -> tuple:
+    """Returns the indexes of the geometry X,Y columns
     Arguments:
         col_name: the column names of the table
-        col_values: the values associated with the column names
+        geom_col_info: the geometry column information
+    Return:
+        Returns a tuple of the indexes of the X,Y column pairs (assumes X1, Y1, X2, Y2, ...)
+    """
+    if len(geom_col_info['sheet_cols']) % 2:
+        raise ValueError('Invalid number of X,Y column name pairs specified')
+
+    return tuple(col_names.index(one_name) for one_name in geom_col_info['sheet_cols'])
+
+
+def transform_geom_rows(col_names: tuple, rows: list, geom_col_info: dict, from_epsg: int, \
+                        to_epsg: int, pt_indexes: tuple=None) -> list:
+    """Transforms the geometry points of many rows to the specified coordinate system
+    Arguments:
+        col_name: the column names of the table
+        rows: the list of row values associated with the column names
         geom_col_info: the geometry column information
         from_epsg: the EPSG code to tranform from
         to_epsg: the EPSG code to transform to
+        pt_indexes: the optional indexes of the geometry columns (see geom_col_indexes)
     Return:
-        Returns a list of column values with the geometry values transformed
+        Returns a list of rows with the geometry values transformed
+    Notes:
+        The points of all the rows are transformed together, which is much faster than
+        transforming each row separately. Rows that are missing any point values are left as
+        they are
     """
     # Check if we can avoid the transformations
-    if from_epsg == to_epsg:
-        return list(col_values)
-    if len(geom_col_info['sheet_cols']) % 2:
-        raise ValueError('Invalid number of X,Y column name pairs specified')
+    if from_epsg == to_epsg or not rows:
+        return rows
+    if pt_indexes is None:
+        pt_indexes = geom_col_indexes(col_names, geom_col_info)
 
-    pt_indexes = []
-    pt_values = []
-    idx = 0
-    while idx < len(geom_col_info['sheet_cols']):
-        x_idx = col_names.index(geom_col_info['sheet_cols'][idx])
-        y_idx = col_names.index(geom_col_info['sheet_cols'][idx+1])
-        pt_indexes.append(x_idx)
-        pt_indexes.append(y_idx)
-        pt_values.append(col_values[x_idx])
-        pt_values.append(col_values[y_idx])
-        idx += 2
+    has_points = [all(one_row[idx] is not None for idx in pt_indexes) for one_row in rows]
+    pt_values = tuple(one_row[idx] for one_row, row_has_points in zip(rows, has_points) \
+                                                        if row_has_points for idx in pt_indexes)
+    if not pt_values:
+        return rows
 
     new_pt_values = transform_points(from_epsg, to_epsg, pt_values)
 
-    return_values = list(col_values)
-    for idx, idx_val in enumerate(pt_indexes):
-        return_values[idx_val] = new_pt_values[idx]
+    return_rows = []
+    pt_idx = 0
+    for one_row, row_has_points in zip(rows, has_points):
+        if not row_has_points:
+            return_rows.append(one_row)
+            continue
+        new_row = list(one_row)
+        for idx_val in pt_indexes:
+            new_row[idx_val] = new_pt_values[pt_idx]
+            pt_idx = pt_idx + 1
+        return_rows.append(new_row)
+
+    return return_rows
 
-    return return_values
+
+def write_rows(table_name: str, col_names: tuple, rows: list, update: bool, write_info: dict, \
+               conn: A2Database) -> int:
+    """Writes a batch of rows to the database
+    Arguments:
+        table_name: the name of the table to write to
+        col_names: the names of the columns
+        rows: the list of row values to write
+        update: whether the rows are updates to existing rows, or new rows
+        write_info: information on how to write the rows (see Notes)
+        conn: the database connection
+    Returns:
+        Returns the number of rows that were added or changed (see A2Database.add_update_data_batch)
+    Notes:
+        The keys and value descriptions in write_info are:
+        'col_alias': the column alias information (see A2Database.get_col_info)
+        'geom_col_info': the geometry column information (see A2Database.get_col_info)
+        'primary_key': the name of the primary key column, or None
+        'verbose': whether to display additional information
+        'transform_epsg': the EPSG code to transform the geometry points from, or None when
+                          the points don't need to be transformed
+        'pt_indexes': the indexes of the geometry columns (see geom_col_indexes)
+    """
+    if not rows:
+        return 0
+
+    if write_info['transform_epsg'] is not None:
+        rows = transform_geom_rows(col_names, rows, write_info['geom_col_info'],
+                                   write_info['transform_epsg'], conn.epsg,
+                                   write_info['pt_indexes'])
+
+    return conn.add_update_data_batch(table_name, col_names, rows, write_info['col_alias'],
+                                      write_info['geom_col_info'], update=update,
+                                      primary_key=write_info['primary_key'],
+                                      verbose=write_info['verbose'])
 
 
 def map_col_type(col_type: str, col_len: int=None, raise_on_error: bool=False) -> str:
@@ -401,31 +545,13 @@ def map_col_type(col_type: str, col_len: int=None, raise_on_error: bool=False) -
     Exceptions:
         Raises an IndexError if the type is not known
     """
-    col_ret_type = None
-    match col_type:
-        case 'Number' | 'Double' | 'Single':
-            col_ret_type = 'DOUBLE'
-
-        case 'Integer' | 'Long Integer':
-            col_ret_type = 'INT'
-
-        case 'Short Text' | 'Long Text':
-            if not col_len or not isinstance(col_len, int):
-                col_ret_type = 'VARCHAR(2048)'
-            else:
-                col_ret_type = f'VARCHAR({col_len})'
-
-        case 'Date/Time' | 'Date With Time':
-            col_ret_type = 'TIMESTAMP'
-
-        case 'Time':
-            col_ret_type = 'TIME'
-
-        case 'Yes/No':
-            col_ret_type = 'TINYINT'
-
-        case 'POINT':
-            col_ret_type = 'POINT'
+    if col_type in TEXT_COL_TYPES:
+        if not col_len or not isinstance(col_len, int):
+            col_ret_type = 'VARCHAR(2048)'
+        else:
+            col_ret_type = f'VARCHAR({col_len})'
+    else:
+        col_ret_type = COL_TYPE_MAP.get(col_type)
 
     if col_ret_type is None and raise_on_error:
         raise IndexError(f'Unknown column type {col_type} found')
@@ -433,39 +559,53 @@ def map_col_type(col_type: str, col_len: int=None, raise_on_error: bool=False) -
     return col_ret_type
 
 
-def db_update_schema(table_name: str, schema_sheet: openpyxl.worksheet.worksheet.Worksheet, \
-                     col_names: tuple, opts: dict, conn: A2Database) -> None:
+def load_schema_rows(schema_sheet: openpyxl.worksheet.worksheet.Worksheet) -> tuple:
+    """Reads the values of all the rows in the schema sheet
+    Arguments:
+        schema_sheet: the sheet containing the schema information
+    Returns:
+        Returns a tuple of the row values, each row is a tuple of its cell values
+    """
+    return tuple(schema_sheet.iter_rows(values_only=True))
+
+
+def db_update_schema(table_name: str, schema_rows: tuple, col_names: tuple, opts: dict, \
+                     conn: A2Database) -> bool:
     """Updates the database schema
     Arguments:
         table_name: the name of the table
-        schema_sheet: the sheet containing the schema information
+        schema_rows: the row values of the sheet containing the schema information
         col_name: the column names from the data sheet
         opts: additional options
         cursor: the database cursor
         conn: the database connection
+    Returns:
+        Returns True if the table was created (and is empty), and False otherwise
     """
     # Define some handy variables
-    lower_col_names = tuple((one_name.casefold() for one_name in col_names))
-    verbose = 'verbose' in opts and opts['verbose']
+    lower_col_names = frozenset((one_name.casefold() for one_name in col_names))
+    verbose = opts.get('verbose', False)
 
     # Check if the table exists
     table_exists = conn.table_exists(table_name)
     if table_exists:
-        if 'force' not in opts or not opts['force']:
+        if not opts.get('force'):
             if verbose:
                 opts['logger'].warning(f'Table {table_name} already exists and the ' \
                                        'force flag is not specified')
                 opts['logger'].warning('    not updating table')
-            return
+            return False
 
     # If we have point columns specified, check that they are valid
     point_col_names = None
     if opts["point_col_x"]:
-        if not opts["point_col_x"].casefold() in lower_col_names:
+        point_col_x = opts["point_col_x"].casefold()
+        point_col_y = opts["point_col_y"].casefold()
+        if not point_col_x in lower_col_names:
             raise ValueError(f'The X column name for point is not found "{opts["point_col_x"]}"')
-        if not opts["point_col_y"].casefold() in lower_col_names:
+        if not point_col_y in lower_col_names:
             raise ValueError(f'The Y column name for point is not found "{opts["point_col_y"]}"')
-        point_col_names = (opts["point_col_x"].casefold(), opts["point_col_y"].casefold())
+        point_col_names = frozenset((point_col_x, point_col_y))
 
     # Load all the indexes into the schema definition sheet
     col_table_idx = int(opts['schema_table_name_col']) - 1 \
@@ -479,77 +619,71 @@ def db_update_schema(table_name: str, schema_sheet: openpyxl.worksheet.worksheet
     col_desc_idx = int(opts['schema_description_col']) - 1 \
                         if opts['schema_description_col'].isnumeric() else None
 
-    # Get the rows iterator
-    rows_iter = schema_sheet.iter_rows()
-
     # Get the column names and find the indexes we're looking for
-    if opts['schema_col_names_row'] > 0:
-        # Skip to the row with the names
-        for _ in range(1, opts['schema_col_names_row']):
-            _ = next(rows_iter)
-        idx = 0
-        for one_col in next(rows_iter):
-            if one_col.value is None:
-                continue
-            cur_name = one_col.value.casefold()
-            if cur_name == opts['schema_table_name_col'].casefold():
-                col_table_idx = idx
-            elif cur_name == opts['schema_field_name_col'].casefold():
-                col_name_idx = idx
-            elif cur_name == opts['schema_data_type_col'].casefold():
-                col_type_idx = idx
-            elif cur_name == opts['schema_data_len_col'].casefold():
-                col_len_idx = idx
-            elif cur_name == opts['schema_description_col'].casefold():
-                col_desc_idx = idx
-            idx = idx + 1
+    col_names_row = opts['schema_col_names_row']
+    if col_names_row > 0:
+        # Map the names of the columns we're looking for to their options
+        col_targets = {opts[one_key].casefold(): one_key for one_key in \
+                            ('schema_description_col', 'schema_data_len_col',
+                             'schema_data_type_col', 'schema_field_name_col',
+                             'schema_table_name_col') \
+                                if not opts[one_key].isnumeric()}
+        col_indexes = {}
+        for idx, one_col in enumerate(schema_rows[col_names_row - 1]):
+            if one_col is not None:
+                cur_name = one_col.casefold()
+                if cur_name in col_targets:
+                    col_indexes[col_targets[cur_name]] = idx
+        col_table_idx = col_indexes.get('schema_table_name_col', col_table_idx)
+        col_name_idx = col_indexes.get('schema_field_name_col', col_name_idx)
+        col_type_idx = col_indexes.get('schema_data_type_col', col_type_idx)
+        col_len_idx = col_indexes.get('schema_data_len_col', col_len_idx)
+        col_desc_idx = col_indexes.get('schema_description_col', col_desc_idx)
 
     if col_name_idx is None or col_type_idx is None or col_desc_idx is None:
         raise IndexError('Unable to find schema columns')
 
-    # Skip over header lines
-    if opts['schema_col_names_row'] < opts['schema_header_lines']:
-        for _ in range(opts['schema_col_names_row'], opts['schema_header_lines']):
-            _ = next(rows_iter)
+    # The column definitions start after the header lines
+    rows_iter = iter(schema_rows[max(col_names_row, opts['schema_header_lines']):])
 
     # Prepare the column information
     col_info = []
-    ignore_columns = opts['ignore_cols'] if 'ignore_cols' in opts and opts['ignore_cols'] else []
+    ignore_columns = frozenset(opts.get('ignore_cols') or ())
+    table_name_lower = table_name.casefold()
+    primary_key_lower = opts['primary_key'].casefold()
+    use_schema_cols = opts.get('use_schema_cols', False)
+    is_primary_text = opts.get('primary_key_text', False)
     for one_row in rows_iter:
+        col_table = one_row[col_table_idx]
+        col_name = one_row[col_name_idx]
         # Skip if we're only adding columns found in the data sheet and it's not a match
-        if 'use_schema_cols' not in opts or not opts['use_schema_cols']:
-            if one_row[col_table_idx].value is None:
-                continue
-            if one_row[col_table_idx].value.casefold() != table_name.casefold():
+        if not use_schema_cols:
+            if col_table is None or col_name is None:
                 continue
-            if one_row[col_name_idx].value is None:
+            if col_name.casefold().replace(' ', '_') not in lower_col_names:
                 continue
-            if one_row[col_name_idx].value.casefold().replace(' ', '_') not in lower_col_names:
-                continue
-        # Skip over the point column names if we're creating a point column
-        if point_col_names and one_row[col_name_idx].value.casefold().replace(' ', '_') \
-                                                                            in point_col_names:
-            continue
         # Make sure this column belongs to the current table
-        col_table = one_row[col_table_idx].value
-        if col_table.casefold() != table_name.casefold():
+        if col_table.casefold() != table_name_lower:
+            continue
+        col_name = col_name.replace(' ', '_')
+        col_name_lower = col_name.casefold()
+        # Skip over the point column names if we're creating a point column
+        if point_col_names and col_name_lower in point_col_names:
             continue
         # Check if we ignore a column
-        col_name = one_row[col_name_idx].value.replace(' ', '_')
-        if col_name.casefold() in ignore_columns:
+        if col_name_lower in ignore_columns:
             continue
         # Add the column information to the list
-        col_type = map_col_type(one_row[col_type_idx].value,
-                        int(one_row[col_len_idx].value) if one_row[col_len_idx].value else 0,
-                        raise_on_error=True)
-        is_primary = col_name.casefold() == opts['primary_key'].casefold()
-        is_primary_text = 'primary_key_text' in opts and opts['primary_key_text']
+        col_len = one_row[col_len_idx]
+        col_type = map_col_type(one_row[col_type_idx], int(col_len) if col_len else 0,
+                                raise_on_error=True)
+        is_primary = col_name_lower == primary_key_lower
         col_info.append({
-            'name': col_name.replace(' ', '_'),
+            'name': col_name,
             'type': 'INT' if is_primary and not is_primary_text else col_type,
             'is_primary': is_primary,
             'auto_increment': is_primary and not is_primary_text, # Primary key auto-increment
-            'description': one_row[col_desc_idx].value,
+            'description': one_row[col_desc_idx],
             'null_allowed': not is_primary,
             'index': is_primary                 # Primary keys are indexed
             })
@@ -557,7 +691,7 @@ def db_update_schema(table_name: str, schema_sheet: openpyxl.worksheet.worksheet
     # Make sure we have something
     if not col_info:
         opts['logger'].warning(f'No column descriptions found for table {table_name}')
-        return
+        return False
 
     # Add in the point column type if we're creating one
     if point_col_names:
@@ -583,102 +717,382 @@ def db_update_schema(table_name: str, schema_sheet: openpyxl.worksheet.worksheet
     # Create a view if we have grometries
     if point_col_names:
         view_name = table_name + '_view'
-        if ('noviews' not in opts or not opts['noviews']):
+        if not opts.get('noviews'):
             conn.create_view(view_name, table_name, col_info, verbose)
-        elif 'force' in opts and opts['force']:
+        elif opts.get('force'):
             conn.drop_view(view_name)
 
+    return True
+
+
+def queue_put(row_queue: queue.Queue, item: Any, stop_reading: threading.Event) -> bool:
+    """Adds the item to the queue, waiting for room if the queue is full
+    Arguments:
+        row_queue: the queue to add to
+        item: the item to add
+        stop_reading: the event that's set when nothing more should be added to the queue
+    Returns:
+        Returns True if the item was added and False if the event was set before there was room
+    """
+    while not stop_reading.is_set():
+        try:
+            row_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def read_sheet_rows(rows_iter: Iterator, get_values: Callable, batch_size: int, \
+                    row_queue: queue.Queue, stop_reading: threading.Event) -> None:
+    """Reads the row values from the sheet and adds them to the queue in batches
+    Arguments:
+        rows_iter: the iterator of data rows to read
+        get_values: the function returning the row values to keep (see A2Database.values_getter)
+        batch_size: the number of row values in each batch
+        row_queue: the queue to add the batches to
+        stop_reading: the event that's set when the rows are no longer wanted
+    Notes:
+        This is run on its own thread (see sheet_row_values). An empty batch is added to the
+        queue when all the rows are read, and any exception is added to the queue in place of a
+        batch
+    """
+    try:
+        batch = []
+        for one_row in rows_iter:
+            batch.append(get_values(one_row))
+            if len(batch) >= batch_size:
+                if not queue_put(row_queue, batch, stop_reading):
+                    return
+                batch = []
+        if batch and not queue_put(row_queue, batch, stop_reading):
+            return
+        queue_put(row_queue, [], stop_reading)
+    except Exception as ex:
+        queue_put(row_queue, ex, stop_reading)
+
+
+def sheet_row_values(rows_iter: Iterator, get_values: Callable, batch_size: int) -> Iterator:
+    """Returns the values of the rows while the following rows are read on a separate thread
+    Arguments:
+        rows_iter: the iterator of data rows to read
+        get_values: the function returning the row values to keep (see A2Database.values_getter)
+        batch_size: the number of rows to read at a time
+    Returns:
+        Returns an iterator of the row values
+    Notes:
+        Reading the sheet overlaps with writing the previous rows to the database. Only a few
+        batches are read ahead so that memory use stays bounded
+    """
+    row_queue = queue.Queue(maxsize=READ_AHEAD_BATCHES)
+    stop_reading = threading.Event()
+    reader = threading.Thread(target=read_sheet_rows, daemon=True,
+                              args=(rows_iter, get_values, batch_size, row_queue, stop_reading))
+    reader.start()
+
+    try:
+        while True:
+            batch = row_queue.get()
+            if isinstance(batch, Exception):
+                raise batch
+            if not batch:
+                break
+            yield from batch
+    finally:
+        stop_reading.set()
+        reader.join()
+
+
+def write_data_lines(out_file, col_names: tuple, rows: list, write_info: dict, \
+                     conn: A2Database) -> None:
+    """Writes the rows to the data file after transforming any geometry points
+    Arguments:
+        out_file: the open data file to write to
+        col_names: the names of the columns
+        rows: the list of row values to write
+        write_info: information on how to write the rows (see process_sheets)
+        conn: the database connection
+    """
+    if write_info['transform_epsg'] is not None:
+        rows = transform_geom_rows(col_names, rows, write_info['geom_col_info'],
+                                   write_info['transform_epsg'], conn.epsg,
+                                   write_info['pt_indexes'])
+
+    out_file.writelines(A2Database.load_data_line(one_row) for one_row in rows)
+
+
+def load_data_rows(table_name: str, col_names: tuple, values_iter: Iterator, write_info: dict, \
+                   opts: dict, conn: A2Database) -> tuple:
+    """Loads the rows into an empty table through a data file
+    Arguments:
+        table_name: the name of the table to load
+        col_names: the names of the columns
+        values_iter: the iterator of row values to load (see sheet_row_values)
+        write_info: information on how to write the rows (see process_sheets)
+        opts: additional options
+        conn: the database connection
+    Returns:
+        Returns a tuple of the number of rows loaded, the number of rows skipped, and the number
+        of the skipped rows that have null primary keys
+    Notes:
+        Loading a data file is much faster than inserting the rows but there aren't any checks for
+        existing rows. The database handles rows with duplicate primary keys the same way as
+        writing the rows does: the later rows are skipped, or replace the earlier rows when
+        forcing. Repeated rows are only loaded once when there isn't a primary key. Geometry
+        points that need transforming are transformed in batches as the file is written. Unique
+        and foreign key checks are turned off while loading since the table starts out empty
+    """
+    batch_size = opts.get('batch_size') or DEFAULT_BATCH_SIZE
+    force = opts['force']
+    primary_key_idx = write_info['primary_key_idx']
+    data_lines = 0
+    skipped_rows = 0
+    null_pk_rows = 0
+    # The rows written when there isn't a primary key
+    written_values = set() if primary_key_idx is None else None
+
+    with tempfile.NamedTemporaryFile(mode='w', encoding='utf-8', newline='', suffix='.txt',
+                                     delete=False) as out_file:
+        load_filename = out_file.name
+        pending_rows = []
+        for col_values in values_iter:
+            if primary_key_idx is not None and col_values[primary_key_idx] is None:
+                null_pk_rows = null_pk_rows + 1
+                continue
+            if written_values is not None:
+                if col_values in written_values:
+                    skipped_rows = skipped_rows + 1
+                    continue
+                written_values.add(col_values)
+
+            pending_rows.append(col_values)
+            data_lines = data_lines + 1
+            if len(pending_rows) >= batch_size:
+                write_data_lines(out_file, col_names, pending_rows, write_info, conn)
+                pending_rows = []
+
+        write_data_lines(out_file, col_names, pending_rows, write_info, conn)
 
-def process_sheets(data_sheet: openpyxl.worksheet.worksheet.Worksheet, \
-                   schema_sheet: openpyxl.worksheet.worksheet.Worksheet, \
+    try:
+        loaded_rows = conn.load_data_file(table_name, col_names, load_filename,
+                                          write_info['col_alias'], write_info['geom_col_info'],
+                                          disable_checks=True, replace=force,
+                                          verbose=write_info['verbose'])
+    finally:
+        os.remove(load_filename)
+
+    # Replacing rows counts each replaced row twice, and every line is either added or replaces
+    # an earlier row. Otherwise the lines that weren't loaded were skipped as duplicates
+    if force:
+        loaded_rows = data_lines
+    else:
+        skipped_rows = skipped_rows + data_lines - loaded_rows
+
+    return loaded_rows, skipped_rows + null_pk_rows, null_pk_rows
+
+
+def write_pending_rows(table_name: str, col_names: tuple, rows: list, force: bool, \
+                       write_info: dict, conn: A2Database, check_table: bool=True) -> tuple:
+    """Checks which rows already exist in the database and writes the batch of rows
+    Arguments:
+        table_name: the name of the table to write to
+        col_names: the names of the columns
+        rows: the list of row values to write
+        force: whether to update rows that already exist
+        write_info: information on how to write the rows (see write_rows)
+        conn: the database connection
+        check_table: set to False when the table is empty so that the rows' keys are only
+                     checked against each other
+    Returns:
+        Returns a tuple of the number of rows written and the number of rows skipped
+    Notes:
+        The rows are split into new and existing rows by the database (see
+        A2Database.split_new_rows). Existing rows that are updated with the values they
+        already have are counted as skipped. In addition to the keys used by write_rows,
+        write_info needs a 'primary_key_idx' key with the index of the primary key column
+    """
+    insert_rows, update_rows = conn.split_new_rows(table_name, write_info['primary_key'], rows,
+                                                   write_info['primary_key_idx'],
+                                                   check_table=check_table,
+                                                   verbose=write_info['verbose'])
+    skipped_rows = 0
+    if not force:
+        skipped_rows = len(update_rows)
+        update_rows = []
+
+    # Inserts are written before updates in case an update is for a row in this batch
+    write_rows(table_name, col_names, insert_rows, False, write_info, conn)
+    changed_rows = write_rows(table_name, col_names, update_rows, True, write_info, conn)
+
+    return len(insert_rows) + changed_rows, skipped_rows + len(update_rows) - changed_rows
+
+
+def process_sheets(data_sheet: openpyxl.worksheet.worksheet.Worksheet, schema_rows: tuple, \
                    opts: dict, conn: A2Database) -> None:
     """Uploads the data in the worksheet
     Arguments:
         data_sheet: the worksheet with data to upload
-        schema_sheet: the worksheeet with the table schema information
+        schema_rows: the row values of the worksheeet with the table schema information (see
+                     load_schema_rows)
         opts: additional options
         conn: the database connection
     """
-    # Get the table name from the sheet title
+    # Get the table name from the sheet title and the options used while processing rows
     table_name = data_sheet.title
-    ignore_columns = tuple(one_ignore.casefold() for one_ignore in opts['ignore_cols']) \
-                            if 'ignore_cols' in opts and opts['ignore_cols'] else tuple()
+    verbose = opts.get('verbose', False)
+    force = opts['force']
+    batch_size = opts.get('batch_size') or DEFAULT_BATCH_SIZE
+    commit_every = opts.get('commit_every') or DEFAULT_COMMIT_EVERY
+    ignore_columns = frozenset(one_ignore.casefold() for one_ignore in \
+                                                                opts.get('ignore_cols') or ())
 
     opts['logger'].info(f'Updating table {table_name} from sheet {data_sheet.title}')
 
-    # Get the rows iterator
-    rows_iter = data_sheet.iter_rows()
+    # Get the rows iterator, starting after the header lines
+    col_names_row = opts['data_col_names_row']
+    first_data_row = max(col_names_row, opts.get('data_header_lines', 0)) + 1
+    rows_iter = data_sheet.iter_rows(min_row=first_data_row, values_only=True)
 
     # Get the column names
     col_names = []
-    # Skip to the row with the names
-    cnt = 1
-    while cnt < opts['data_col_names_row']:
-        _ = next(rows_iter)
-        cnt = cnt + 1
-
-    # Get the column names
-    ignore_idx = []
-    idx = 0
-    for one_col in next(rows_iter):
-        if one_col.value is not None and one_col.value.casefold() not in ignore_columns:
-            col_names.append(one_col.value.replace(' ', '_'))
-        else:
-            ignore_idx.append(idx)
-        idx += 1
+    kept_idx = []
+    for idx, one_col in enumerate(next(data_sheet.iter_rows(min_row=col_names_row,
+                                                            max_row=col_names_row,
+                                                            values_only=True))):
+        if one_col is not None and one_col.casefold() not in ignore_columns:
+            col_names.append(one_col.replace(' ', '_'))
+            kept_idx.append(idx)
+    values_iter = sheet_row_values(rows_iter, A2Database.values_getter(tuple(kept_idx)),
+                                   batch_size)
 
     # Add/Change the schema
-    if schema_sheet:
-        db_update_schema(table_name, schema_sheet, col_names, opts, conn)
+    table_created = False
+    if schema_rows is not None:
+        table_created = db_update_schema(table_name, schema_rows, col_names, opts, conn)
         opts['logger'].info(f'    Updated the schema for {table_name}')
         if opts["schema_only"]:
             return
 
     # Find geometry columns
-    geom_col_info, col_alias = conn.get_col_info(table_name, col_names, opts['geometry_epsg'],
+    geometry_epsg = opts['geometry_epsg']
+    geom_col_info, col_alias = conn.get_col_info(table_name, col_names, geometry_epsg,
                                             colX1=opts['point_col_x'], rowY1=opts['point_col_y'])
+    transform_geom = geom_col_info and conn.epsg != geometry_epsg
+    pt_indexes = geom_col_indexes(col_names, geom_col_info) if transform_geom else None
 
     # Process the rows
     skipped_rows = 0
     added_updated_rows = 0
-    primary_key_idx = col_names.index(opts['primary_key']) if ('no_primary' in opts and \
-                                not opts['no_primary']) or 'no_primary' not in opts else None
-    primary_key_name = opts['primary_key'] if ('no_primary' in opts and \
-                                not opts['no_primary']) or 'no_primary' not in opts else None
-    for one_row in rows_iter:
-        col_values = tuple(one_cell.value for idx,one_cell in enumerate(one_row) \
-                                                                        if idx not in ignore_idx)
+    null_pk_rows = 0
+    primary_key_name = opts['primary_key'] if not opts.get('no_primary') else None
+    primary_key_idx = col_names.index(primary_key_name) if primary_key_name is not None else None
+
+    # Rows are written to the database in batches
+    write_info = {'col_alias': col_alias,
+                  'geom_col_info': geom_col_info,
+                  'primary_key': primary_key_name,
+                  'primary_key_idx': primary_key_idx,
+                  'verbose': verbose,
+                  'transform_epsg': geometry_epsg if transform_geom else None,
+                  'pt_indexes': pt_indexes
+                 }
+
+    # The primary keys only need to be checked against each other until rows are written to a
+    # table that started out empty
+    table_empty = table_created or conn.table_is_empty(table_name, verbose=verbose)
+    check_table = not table_empty
+
+    # New and empty tables can be loaded from a data file since there's nothing to check against
+    if opts.get('load_data') and table_empty:
+        # This uses up the rows so there's nothing left for the loop below
+        added_updated_rows, skipped_rows, null_pk_rows = load_data_rows(table_name, col_names,
+                                                                        values_iter, write_info,
+                                                                        opts, conn)
+
+    # Per-row lookups bound to locals
+    logger = opts['logger']
+    check_data_exists = conn.check_data_exists
+
+    # Rows waiting to be checked against the database when there's a primary key
+    pending_rows = []
+    # Rows waiting to be written when there isn't a primary key
+    insert_rows = []
+    update_rows = []
+    pending_values = set()
+    # The number of full batches written, used to commit periodically
+    batches_written = 0
+
+    for col_values in values_iter:
         # Check for primary key when specified
         if primary_key_idx is not None:
-            pk_value = col_values[primary_key_idx]
-            if pk_value is None:
-                opts['logger'].info('Skipping row with null primary key value: ' \
-                      f'row {added_updated_rows + skipped_rows + opts["data_col_names_row"] + 1}')
+            if col_values[primary_key_idx] is None:
+                if verbose:
+                    logger.info('Skipping row with null primary key value: row %s',
+                                len(pending_rows) + added_updated_rows + skipped_rows + \
+                                                                                first_data_row)
+                null_pk_rows = null_pk_rows + 1
                 skipped_rows = skipped_rows + 1
                 continue
 
+            # Check the primary keys against the database a batch at a time
+            pending_rows.append(col_values)
+            if len(pending_rows) >= batch_size:
+                cur_written, cur_skipped = write_pending_rows(table_name, col_names, pending_rows,
+                                                              force, write_info, conn,
+                                                              check_table)
+                check_table = check_table or cur_written > 0
+                added_updated_rows = added_updated_rows + cur_written
+                skipped_rows = skipped_rows + cur_skipped
+                pending_rows.clear()
+                batches_written = batches_written + 1
+                if commit_every and batches_written % commit_every == 0:
+                    conn.commit()
+            continue
+
         # Check for existing data and skip this row if it exists and we're not forcing
-        data_exists = conn.check_data_exists(table_name, col_names, col_values,
-                                            geom_col_info=geom_col_info,
-                                            primary_key=primary_key_name,
-                                            verbose=opts['verbose'] if 'verbose' in opts else False)
-        if data_exists and not opts['force']:
+        data_exists = col_values in pending_values or \
+                        check_data_exists(table_name, col_names, col_values,
+                                          geom_col_info=geom_col_info, verbose=verbose)
+        pending_values.add(col_values)
+        if data_exists and not force:
             skipped_rows = skipped_rows + 1
             continue
 
         added_updated_rows = added_updated_rows + 1
-        if geom_col_info and conn.epsg != opts['geometry_epsg']:
-            col_values = transform_geom_cols(col_names, col_values, geom_col_info, \
-                                             opts['geometry_epsg'], conn.epsg)
-        conn.add_update_data(table_name, col_names, col_values, col_alias, geom_col_info, \
-                             update=data_exists, \
-                             primary_key=primary_key_name, verbose=opts['verbose'])
-
+        if data_exists:
+            update_rows.append(col_values)
+        else:
+            insert_rows.append(col_values)
+
+        # Write out full batches. Pending inserts are written before updates in case an update
+        # is for a row that's waiting to be inserted
+        if len(insert_rows) >= batch_size or len(update_rows) >= batch_size:
+            write_rows(table_name, col_names, insert_rows, False, write_info, conn)
+            insert_rows.clear()
+            pending_values.clear()
+            if len(update_rows) >= batch_size:
+                write_rows(table_name, col_names, update_rows, True, write_info, conn)
+                update_rows.clear()
+            batches_written = batches_written + 1
+            if commit_every and batches_written % commit_every == 0:
+                conn.commit()
+
+    # Write out any remaining rows
+    if pending_rows:
+        cur_written, cur_skipped = write_pending_rows(table_name, col_names, pending_rows, force,
+                                                      write_info, conn, check_table)
+        added_updated_rows = added_updated_rows + cur_written
+        skipped_rows = skipped_rows + cur_skipped
+    write_rows(table_name, col_names, insert_rows, False, write_info, conn)
+    write_rows(table_name, col_names, update_rows, True, write_info, conn)
+
+    if null_pk_rows:
+        logger.info(f'    Skipped {null_pk_rows} rows with null primary key values')
     if skipped_rows:
-        opts['logger'].info(f'    Processed {added_updated_rows + skipped_rows}' \
-                            f'data rows with {skipped_rows} not updated')
+        logger.info(f'    Processed {added_updated_rows + skipped_rows} ' \
+                    f'data rows with {skipped_rows} not updated')
     else:
-        opts['logger'].info(f'    Processed {added_updated_rows + skipped_rows} data rows')
+        logger.info(f'    Processed {added_updated_rows + skipped_rows} data rows')
 
 
 def confirm_options(opts: dict, workbook: openpyxl.workbook.workbook.Workbook) -> tuple:
@@ -692,28 +1106,28 @@ def confirm_options(opts: dict, workbook: openpyxl.workbook.workbook.Workbook) -
         Will print out any problems to stdout
     """
     # Check if we're schema only
-    schema_only = opts['schema_only'] if 'schema_only' in opts else False
+    schema_only = opts.get('schema_only', False)
+    schema_name = opts.get('schema_sheet_name')
 
     # Confirm the sheets exist
     if not 'data_sheet_name' in opts:
         opts['logger'].error('You need to specify the data sheet name')
         return None, None
-    if not opts['data_sheet_name'] or opts['data_sheet_name'] not in workbook.sheetnames:
-        opts['logger'].error(f'Unable to find sheet {opts["data_sheet_name"]} in excel file')
+    sheet_names = frozenset(workbook.sheetnames)
+    data_name = opts['data_sheet_name']
+    if not data_name or data_name not in sheet_names:
+        opts['logger'].error(f'Unable to find sheet {data_name} in excel file')
         return None, None
-    if 'schema_sheet_name' in opts and opts['schema_sheet_name']:
-        if opts['schema_sheet_name'] not in workbook.sheetnames:
-            opts['logger'].error(f'Unable to find schema sheet {opts["schema_sheet_name"]} ' \
-                                  'in excel file')
+    if schema_name:
+        if schema_name not in sheet_names:
+            opts['logger'].error(f'Unable to find schema sheet {schema_name} in excel file')
             return None, None
-    if schema_only and not opts['schema_sheet_name']:
+    if schema_only and not schema_name:
         opts['logger'].warning('Schema only is set but no schema sheet name is specified')
 
     # We don't check column information here
 
-    return workbook[opts['data_sheet_name']], \
-           workbook[opts['schema_sheet_name']] if 'schema_sheet_name' in opts and \
-                                                    opts['schema_sheet_name'] else None
+    return workbook[data_name], workbook[schema_name] if schema_name else None
 
 
 def load_excel_file(filepath: str, opts: dict) -> None:
@@ -742,29 +1156,39 @@ def load_excel_file(filepath: str, opts: dict) -> None:
             database=opts["database"],
             password=opts["password"],
             user=opts["user"],
-            logger=opts['logger']
+            logger=opts['logger'],
+            compress=opts.get('compress', False),
+            allow_local_infile=opts.get('load_data', False)
         )
     except mysql.connector.errors.ProgrammingError:
         opts['logger'].error('', exc_info=True)
         opts['logger'].error('Please correct errors and try again')
         sys.exit(101)
 
-    # Set the default database EPSG
-    db_conn.epsg = opts['database_epsg']
+    # Make sure the connection is closed no matter how we leave
+    with db_conn:
+        # Set the default database EPSG
+        db_conn.epsg = opts['database_epsg']
 
-    # Open the EXCEL file
-    workbook = load_workbook(filename=filepath, read_only=True, data_only=True)
+        # Open the EXCEL file
+        workbook = load_workbook(filename=filepath, read_only=True, data_only=True,
+                                 keep_links=False)
+        try:
+            # Make sure the values specified as parameters make sense
+            data_sheet, schema_sheet = confirm_options(opts, workbook)
+            if not data_sheet:
+                sys.exit(102)
 
-    # Make sure the values specified as parameters make sense
-    data_sheet, schema_sheet = confirm_options(opts, workbook)
-    if not data_sheet:
-        sys.exit(102)
+            # Read the schema before streaming the data sheet
+            schema_rows = load_schema_rows(schema_sheet) if schema_sheet else None
 
-    opts['logger'].info(f'Updating using {filepath}')
+            opts['logger'].info(f'Updating using {filepath}')
 
-    process_sheets(data_sheet, schema_sheet, opts, db_conn)
+            process_sheets(data_sheet, schema_rows, opts, db_conn)
 
-    db_conn.commit()
+            db_conn.commit()
+        finally:
+            workbook.close()
 
 
 if __name__ == '__main__':
@@ -7,8 +7,11 @@ import os
 import argparse
 import sys
 import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import islice
 from datetime import datetime
 from getpass import getpass
+import threading
 from typing import Optional
 import openpyxl
 from openpyxl import load_workbook
@@ -20,13 +23,15 @@ from a2database import A2Database
 
 # Check if we have the geometry transformation module
 try:
-    from osgeo import ogr
     from osgeo import osr
 except ModuleNotFoundError:
     GEOM_CAN_TRANSFORM = False
 else:
     GEOM_CAN_TRANSFORM = True
 
+# The cached coordinate transformations of each thread (see get_transform)
+TRANSFORM_CACHE = threading.local()
+
 # The name of our script
 SCRIPT_NAME = os.path.basename(__file__)
 
@@ -45,6 +50,13 @@ DEFAULT_PRIMARY_KEY_NAME = 'globalid'
 # Default EPSG code for points
 DEFAULT_GEOM_EPSG = 4326
 
+# Default number of rows to write to the database at one time. Kept modest so that the
+# multi-row statements stay well under the server's max_allowed_packet
+DEFAULT_BATCH_SIZE = 1000
+
+# Default number of worker processes used to load sheets
+DEFAULT_NUM_WORKERS = 1
+
 # Default name for logging output
 DEFAULT_LOG_FILENAME = 'data_xfer_excel.out'
 
@@ -117,6 +129,15 @@ ARGPARSE_ESRI_CLIENT_ID_HELP = 'The ID of the client to connect to'
 ARGPARSE_ESRI_FEATURE_ID_HELP = 'The ID of the feature to get the database schema from'
 # Lowering the debug level to DEBUG
 ARGPARSE_LOGGING_DEBUG_HELP = 'Increases the logging level to include debugging messages'
+# Help for the number of rows written at one time
+ARGPARSE_BATCH_SIZE_HELP = 'The number of rows to write to the database at one time ' \
+                           f'(default {DEFAULT_BATCH_SIZE} rows)'
+# Number of processes loading sheets
+ARGPARSE_WORKERS_HELP = 'The number of processes used to load the sheets of an EXCEL file at ' \
+                        f'the same time (default {DEFAULT_NUM_WORKERS}). Only use when the ' \
+                        'sheets\' tables don\'t reference each other. Each sheet is committed ' \
+                        'on its own, so sheets that were loaded stay loaded when another sheet ' \
+                        'fails. Ignored when --reset is specified'
 
 
 def get_arguments(logger: logging.Logger) -> tuple:
@@ -170,16 +191,17 @@ def get_arguments(logger: logging.Logger) -> tuple:
     parser.add_argument('-ec', '--esri_client_id', help=ARGPARSE_ESRI_CLIENT_ID_HELP)
     parser.add_argument('-ef', '--esri_feature_id', help=ARGPARSE_ESRI_FEATURE_ID_HELP)
     parser.add_argument('--debug', help=ARGPARSE_LOGGING_DEBUG_HELP)
+    parser.add_argument('--batch_size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=ARGPARSE_BATCH_SIZE_HELP)
+    parser.add_argument('--workers', type=int, default=DEFAULT_NUM_WORKERS,
+                        help=ARGPARSE_WORKERS_HELP)
     args = parser.parse_args()
 
     # Find the EXCEL file and the password (which is allowed to be eliminated)
     excel_file = None
     if args.excel_file:
         excel_file = args.excel_file
-        try:
-            with open(excel_file, encoding="utf-8"):
-                pass
-        except FileNotFoundError:
+        if not os.path.isfile(excel_file) or not os.access(excel_file, os.R_OK):
             logger.error(f'Unable to open EXCEL file {excel_file}')
             sys.exit(11)
 
@@ -190,6 +212,12 @@ def get_arguments(logger: logging.Logger) -> tuple:
     if not args.esri_feature_id:
         logger.error(f'Please specify the ESRI feature ID to use')
         sys.exit(15)
+    if args.workers < 1:
+        logger.error('The number of workers must be a positive number')
+        sys.exit(16)
+    if args.batch_size < 1:
+        logger.error('The batch size must be a positive number')
+        sys.exit(17)
 
     # Create the table name map
     table_name_map = {}
@@ -223,7 +251,9 @@ def get_arguments(logger: logging.Logger) -> tuple:
                 'esri_endpoint': args.esri_endpoint,
                 'esri_client_id': args.esri_client_id,
                 'esri_feature_id': args.esri_feature_id,
-                'debug': args.debug
+                'debug': args.debug,
+                'workers': args.workers,
+                'batch_size': args.batch_size
                }
 
     # Postprocess column name mapping if there are any
@@ -242,11 +272,12 @@ def get_arguments(logger: logging.Logger) -> tuple:
     return excel_file, cmd_opts
 
 
-def init_logging(filename: str, level: int=logging.INFO) -> logging.Logger:
+def init_logging(filename: str, level: int=logging.INFO, mode: str='w') -> logging.Logger:
     """Initializes the logging
     Arguments:
         filename: name of the file to save logging to
         level: the logging level to use
+        mode: the mode to open the logging file with
     Return:
         Returns the created logger instance
     """
@@ -262,13 +293,58 @@ def init_logging(filename: str, level: int=logging.INFO) -> logging.Logger:
     logger.addHandler(cur_handler)
 
     # Output file handler
-    cur_handler = logging.FileHandler(filename, mode='w')
+    cur_handler = logging.FileHandler(filename, mode=mode)
     cur_handler.setFormatter(formatter)
     logger.addHandler(cur_handler)
 
     return logger
 
 
+def init_worker_logging(filename: str, level: int=logging.INFO) -> None:
+    """Initializes the logging of a worker process
+    Arguments:
+        filename: name of the file to save logging to
+        level: the logging level to use
+    Notes:
+        Forked processes already have the logging handlers of the main process. Otherwise the
+        logging is set up again, adding to the logging file instead of replacing it
+    """
+    if not logging.getLogger().handlers:
+        init_logging(filename, level, mode='a')
+
+
+def get_transform(from_epsg: int, to_epsg: int) -> tuple:
+    """Returns the coordinate transformation between two coordinate systems
+    Arguments:
+        from_epsg: original EPSG code
+        to_epsg: EPSG code to transform points to
+    Returns:
+        A tuple of the from and to spatial references, and the transformation
+    Notes:
+        Transformations are expensive to create so they are cached. The spatial references
+        aren't thread-safe so each thread has its own cache. The spatial references are
+        returned to keep them alive for as long as the transformation is in use
+    """
+    transforms = getattr(TRANSFORM_CACHE, 'transforms', None)
+    if transforms is None:
+        transforms = TRANSFORM_CACHE.transforms = {}
+
+    cache_key = (from_epsg, to_epsg)
+    if cache_key not in transforms:
+        from_sr = osr.SpatialReference()
+        from_sr.ImportFromEPSG(int(from_epsg))
+        to_sr = osr.SpatialReference()
+        to_sr.ImportFromEPSG(int(to_epsg))
+        # Keep the X,Y (longitude, latitude) order of our values for all coordinate systems
+        if hasattr(osr, 'OAMS_TRADITIONAL_GIS_ORDER'):
+            from_sr.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+            to_sr.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        transforms[cache_key] = (from_sr, to_sr,
+                                 osr.CreateCoordinateTransformation(from_sr, to_sr))
+
+    return transforms[cache_key]
+
+
 def transform_points(from_epsg: int, to_epsg: int, values: tuple) -> list:
     """Returns the list with the last num_values converted to the new coordinate system
     Arguments:
@@ -286,25 +362,30 @@ def transform_points(from_epsg: int, to_epsg: int, values: tuple) -> list:
     if not GEOM_CAN_TRANSFORM:
         raise ValueError('Unable to transform points, supporting osgeo module is not installed')
 
-    # Transform the points
-    return_values = []
-    idx = 0
-    from_sr = osr.SpatialReference()
-    from_sr.ImportFromEPSG(int(from_epsg))
-    to_sr = osr.SpatialReference()
-    to_sr.ImportFromEPSG(int(to_epsg))
-    transform = osr.CreateCoordinateTransformation(from_sr, to_sr)
-    while idx < len(values):
-        cur_geom = ogr.CreateGeometryFromWkt(f'POINT({values[idx]} {values[idx+1]} {from_epsg})')
-        cur_geom.Transform(transform)
-        return_values.extend((cur_geom.GetX(), cur_geom.GetY()))
-        idx = idx + 2
+    # Transform all the points in one call
+    _, _, transform = get_transform(int(from_epsg), int(to_epsg))
+    new_points = transform.TransformPoints([(float(values[idx]), float(values[idx+1])) \
+                                                        for idx in range(0, len(values), 2)])
 
-    return return_values
+    return [one_coord for one_point in new_points for one_coord in one_point[:2]]
+
+
+def geom_col_indexes(col_names: tuple, geom_col_info: dict) -> tuple:
+    """Returns the indexes of the geometry X,Y columns
+    Arguments:
+        col_name: the column names of the table
+        geom_col_info: the geometry column information
+    Return:
+        Returns a tuple of the indexes of the X,Y column pairs (assumes X1, Y1, X2, Y2, ...)
+    """
+    if len(geom_col_info['sheet_cols']) % 2:
+        raise ValueError('Invalid number of X,Y column name pairs specified')
+
+    return tuple(col_names.index(one_name) for one_name in geom_col_info['sheet_cols'])
 
 
 def transform_geom_cols(col_names: tuple, col_values: tuple, geom_col_info: dict, from_epsg: int, \
-                        to_epsg: int) -> list:
+                        to_epsg: int, pt_indexes: tuple=None) -> list:
     """Transforms geometry point to the specified coordinate system
     Arguments:
         col_name: the column names of the table
@@ -312,26 +393,19 @@ def transform_geom_cols(col_names: tuple, col_values: tuple, geom_col_info: dict
         geom_col_info: the geometry column information
         from_epsg: the EPSG code to tranform from
         to_epsg: the EPSG code to transform to
+        pt_indexes: the optional indexes of the geometry columns (see geom_col_indexes)
     Return:
         Returns a list of column values with the geometry values transformed
+    Notes:
+        Callers transforming many rows should find pt_indexes once and pass it in
     """
     # Check if we can avoid the transformations
     if from_epsg == to_epsg:
         return list(col_values)
-    if len(geom_col_info['sheet_cols']) % 2:
-        raise ValueError('Invalid number of X,Y column name pairs specified')
+    if pt_indexes is None:
+        pt_indexes = geom_col_indexes(col_names, geom_col_info)
 
-    pt_indexes = []
-    pt_values = []
-    idx = 0
-    while idx < len(geom_col_info['sheet_cols']):
-        x_idx = col_names.index(geom_col_info['sheet_cols'][idx])
-        y_idx = col_names.index(geom_col_info['sheet_cols'][idx+1])
-        pt_indexes.append(x_idx)
-        pt_indexes.append(y_idx)
-        pt_values.append(col_values[x_idx])
-        pt_values.append(col_values[y_idx])
-        idx += 2
+    pt_values = tuple(col_values[idx] for idx in pt_indexes)
 
     new_pt_values = transform_points(from_epsg, to_epsg, pt_values)
 
@@ -342,6 +416,52 @@ def transform_geom_cols(col_names: tuple, col_values: tuple, geom_col_info: dict
     return return_values
 
 
+def transform_geom_rows(col_names: tuple, rows: list, geom_col_info: dict, from_epsg: int, \
+                        to_epsg: int, pt_indexes: tuple=None) -> list:
+    """Transforms the geometry points of many rows to the specified coordinate system
+    Arguments:
+        col_name: the column names of the table
+        rows: the list of row values associated with the column names
+        geom_col_info: the geometry column information
+        from_epsg: the EPSG code to tranform from
+        to_epsg: the EPSG code to transform to
+        pt_indexes: the optional indexes of the geometry columns (see geom_col_indexes)
+    Return:
+        Returns a list of rows with the geometry values transformed
+    Notes:
+        The points of all the rows are transformed together, which is much faster than
+        transforming each row separately. Rows that are missing any point values are left as
+        they are
+    """
+    # Check if we can avoid the transformations
+    if from_epsg == to_epsg or not rows:
+        return rows
+    if pt_indexes is None:
+        pt_indexes = geom_col_indexes(col_names, geom_col_info)
+
+    has_points = [all(one_row[idx] is not None for idx in pt_indexes) for one_row in rows]
+    pt_values = tuple(one_row[idx] for one_row, row_has_points in zip(rows, has_points) \
+                                                        if row_has_points for idx in pt_indexes)
+    if not pt_values:
+        return rows
+
+    new_pt_values = transform_points(from_epsg, to_epsg, pt_values)
+
+    return_rows = []
+    pt_idx = 0
+    for one_row, row_has_points in zip(rows, has_points):
+        if not row_has_points:
+            return_rows.append(one_row)
+            continue
+        new_row = list(one_row)
+        for idx_val in pt_indexes:
+            new_row[idx_val] = new_pt_values[pt_idx]
+            pt_idx = pt_idx + 1
+        return_rows.append(new_row)
+
+    return return_rows
+
+
 def db_get_fk_constraints(conn: A2Database, table_name: str, logger: logging.Logger,
                           verbose: bool=False) -> Optional[dict]:
     """Returns the foreign key constraints that point to the specified table, not the table's
@@ -482,6 +602,61 @@ def map_col_name(sheet_ids: tuple, col_name: str, col_maps: tuple) -> str:
     return col_name
 
 
+def write_sheet_rows(conn: A2Database, table_name: str, col_names: tuple, rows: list,
+                     write_info: dict, opts: dict) -> tuple:
+    """Adds new rows and updates changed rows of a batch of sheet rows
+    Arguments:
+        conn: the database connection
+        table_name: the name of the table to write to
+        col_names: the names of the columns
+        rows: the list of row values to write
+        write_info: information on how to write the rows (see Notes)
+        opts: additional options
+    Returns:
+        Returns a tuple of the number of rows written and the number of rows skipped
+    Notes:
+        The rows are split into new and existing rows by the database (see
+        A2Database.split_new_rows), and the database also determines which of the existing
+        rows have changed when they're updated. The keys and value descriptions in write_info
+        are:
+        'col_alias': the column alias information (see A2Database.get_col_info)
+        'geom_col_info': the geometry column information (see A2Database.get_col_info)
+        'primary_key_idx': the index of the primary key column
+        'transform_epsg': the EPSG code to transform the geometry points from, or None when
+                          the points don't need to be transformed
+        'pt_indexes': the indexes of the geometry columns (see geom_col_indexes)
+    """
+    verbose = 'verbose' in opts and opts['verbose']
+    insert_rows, update_rows = conn.split_new_rows(table_name, opts['primary_key'], rows,
+                                                   write_info['primary_key_idx'], verbose=verbose)
+
+    # Skip existing rows if we're not forcing
+    skipped_rows = 0
+    if not opts['force']:
+        skipped_rows = len(update_rows)
+        update_rows = []
+
+    # Inserts are written before updates in case an update is for a row in this batch
+    written_rows = 0
+    for update, cur_rows in ((False, insert_rows), (True, update_rows)):
+        if write_info['transform_epsg'] is not None:
+            cur_rows = transform_geom_rows(col_names, cur_rows, write_info['geom_col_info'],
+                                           write_info['transform_epsg'], conn.epsg,
+                                           write_info['pt_indexes'])
+        cur_written = conn.add_update_data_batch(table_name, col_names, cur_rows,
+                                                 write_info['col_alias'],
+                                                 write_info['geom_col_info'], update=update,
+                                                 primary_key=opts['primary_key'],
+                                                 verbose=verbose)
+        # Rows that are updated with the values they already have aren't counted as written
+        if update and cur_written < len(cur_rows):
+            opts['logger'].info(f'Skipping {len(cur_rows) - cur_written} unchanged data rows')
+            skipped_rows = skipped_rows + len(cur_rows) - cur_written
+        written_rows = written_rows + cur_written
+
+    return written_rows, skipped_rows
+
+
 def process_sheet(sheet: openpyxl.worksheet.worksheet.Worksheet, conn: A2Database, opts: dict) \
                     -> None:
     """Uploads the data in the worksheet
@@ -504,7 +679,7 @@ def process_sheet(sheet: openpyxl.worksheet.worksheet.Worksheet, conn: A2Databas
         opts['logger'].info(f'Updating table {table_name} from tab {sheet.title}')
 
     # Get the rows iterator
-    rows_iter = sheet.iter_rows()
+    rows_iter = sheet.iter_rows(values_only=True)
 
     # Get the column names
     if 'col_names' in opts and opts['col_names']:
@@ -514,12 +689,9 @@ def process_sheet(sheet: openpyxl.worksheet.worksheet.Worksheet, conn: A2Databas
         # Find the row with the column names
         col_names = []
         # Skip to the row with the names
-        cnt = 1
-        while cnt < opts['col_names_row']:
-            _ = next(rows_iter)
-        for one_col in next(rows_iter):
+        for one_col in next(islice(rows_iter, opts['col_names_row'] - 1, None)):
             # Check if we're mapping this name
-            col_names.append(map_col_name((sheet.title, table_name), one_col.value,
+            col_names.append(map_col_name((sheet.title, table_name), one_col,
                                           opts['col_name_map']))
 
     # Find geometry columns
@@ -536,45 +708,45 @@ def process_sheet(sheet: openpyxl.worksheet.worksheet.Worksheet, conn: A2Databas
         conn.execute(query)
         conn.reset()
 
-    # Process the rows
+    # Find the column indexes used on each row
+    primary_key_idx = col_names.index(opts['primary_key'])
+    transform_geom = geom_col_info and conn.epsg != opts['geometry_epsg']
+    pt_indexes = geom_col_indexes(col_names, geom_col_info) if transform_geom else None
+
+    # Process the rows a batch at a time
+    batch_size = opts['batch_size'] if 'batch_size' in opts and opts['batch_size'] else \
+                                                                            DEFAULT_BATCH_SIZE
+    write_info = {'col_alias': col_alias,
+                  'geom_col_info': geom_col_info,
+                  'primary_key_idx': primary_key_idx,
+                  'transform_epsg': opts['geometry_epsg'] if transform_geom else None,
+                  'pt_indexes': pt_indexes
+                 }
+    logger = opts['logger']
+    pending_rows = []
     skipped_rows = 0
     added_updated_rows = 0
-    for one_row in rows_iter:
-        col_values = tuple(one_cell.value for one_cell in one_row)
-
+    for col_values in rows_iter:
         # Skip over missing primary keys
-        pk_value = col_values[col_names.index(opts['primary_key'])]
-        if pk_value is None:
-            opts['logger'].info('Skipping data row with null primary key value: ' \
-                  f'row {added_updated_rows + skipped_rows + 1}')
+        if col_values[primary_key_idx] is None:
+            logger.info('Skipping data row with null primary key value: row %s',
+                        len(pending_rows) + added_updated_rows + skipped_rows + 1)
             skipped_rows = skipped_rows + 1
             continue
 
-        # Check for existing data and skip this row if it exists and we're not forcing
-        data_exists = conn.check_data_exists_pk(table_name, opts['primary_key'], pk_value,
-                                                verbose=verbose)
-        if data_exists and not opts['force']:
-            skipped_rows = skipped_rows + 1
-            continue
+        pending_rows.append(col_values)
+        if len(pending_rows) >= batch_size:
+            cur_written, cur_skipped = write_sheet_rows(conn, table_name, col_names, pending_rows,
+                                                        write_info, opts)
+            added_updated_rows = added_updated_rows + cur_written
+            skipped_rows = skipped_rows + cur_skipped
+            pending_rows.clear()
 
-        # Check if there are changes to an existing row
-        if data_exists:
-            data_same = conn.check_data_exists(table_name, col_names, col_values,
-                                geom_col_info=geom_col_info,
-                                verbose=verbose)
-            if data_same:
-                opts['logger'].info(f'Skipping unchanged data row: primary key value {pk_value}')
-                skipped_rows = skipped_rows + 1
-                continue
-
-        added_updated_rows = added_updated_rows + 1
-        if geom_col_info and conn.epsg != opts['geometry_epsg']:
-            col_values = transform_geom_cols(col_names, col_values, geom_col_info, \
-                                             opts['geometry_epsg'], conn.epsg)
-        conn.add_update_data(table_name, col_names, col_values, col_alias, geom_col_info, \
-                             update=data_exists, \
-                             primary_key=opts['primary_key'],
-                             verbose=verbose)
+    if pending_rows:
+        cur_written, cur_skipped = write_sheet_rows(conn, table_name, col_names, pending_rows,
+                                                    write_info, opts)
+        added_updated_rows = added_updated_rows + cur_written
+        skipped_rows = skipped_rows + cur_skipped
 
     if saved_constraints:
         db_restore_fk_constraints(conn, saved_constraints, opts['logger'], verbose)
@@ -586,6 +758,35 @@ def process_sheet(sheet: openpyxl.worksheet.worksheet.Worksheet, conn: A2Databas
         opts['logger'].info(f'    Processed {added_updated_rows} rows')
 
 
+def process_sheet_file(filepath: str, sheet_name: str, opts: dict) -> None:
+    """Uploads the data in one worksheet of an EXCEL file using its own database connection
+    Arguments:
+        filepath: the path to the EXCEL file
+        sheet_name: the name of the worksheet to upload
+        opts: additional options
+    Notes:
+        Intended to be run in a separate process since database connections can't be shared
+        between processes
+    """
+    with a2database.connect(
+            host=opts["host"],
+            database=opts["database"],
+            password=opts["password"],
+            user=opts["user"],
+            logger=opts['logger']
+        ) as db_conn:
+        db_conn.epsg = opts['database_epsg']
+
+        workbook = load_workbook(filename=filepath, read_only=True, data_only=True,
+                                 keep_links=False)
+        try:
+            process_sheet(workbook[sheet_name], db_conn, opts)
+        finally:
+            workbook.close()
+
+        db_conn.commit()
+
+
 def process_esri_row(conn: A2Database, table_name: str, col_names: tuple, col_values: tuple,
                      opts: dict, verbose: bool=False) -> bool:
     """Handles the processing of one row of EsRI data
@@ -714,10 +915,9 @@ def process_esri_data(conn: A2Database, endpoint_url: str, client_id: str, featu
             conn.reset()
 
         # Get date indexes
-        date_indexes = []
-        for field_idx, one_field in enumerate(feature_layer.properties['fields']):
-            if one_field['type'] == 'esriFieldTypeDate':
-                date_indexes.append(field_idx)
+        date_indexes = tuple(field_idx for field_idx, one_field in \
+                                enumerate(feature_layer.properties['fields']) \
+                                    if one_field['type'] == 'esriFieldTypeDate')
 
         # Process feature data
         for one_res in feature_layer.query('OBJECTID >= 0'):
@@ -725,9 +925,9 @@ def process_esri_data(conn: A2Database, endpoint_url: str, client_id: str, featu
             names = tuple(map_col_name((table_name,), one_name, opts['col_name_map']) \
                                                                         for one_name in names)
             if date_indexes:
-                values = tuple(values)
-                values = tuple(datetime.utcfromtimestamp(int(values[cur_idx]/1000.0)) if cur_idx in \
-                                date_indexes else values[cur_idx] for cur_idx in range(0, len(values)))
+                values = list(values)
+                for cur_idx in date_indexes:
+                    values[cur_idx] = datetime.utcfromtimestamp(int(values[cur_idx]/1000.0))
             try:
                 if process_esri_row(conn, table_name, tuple(names), tuple(values), opts, verbose):
                     added_updated_rows = added_updated_rows + 1
@@ -764,19 +964,18 @@ def process_esri_data(conn: A2Database, endpoint_url: str, client_id: str, featu
             conn.reset()
 
         # Get date indexes
-        date_indexes = []
-        for field_idx, one_field in enumerate(one_table.properties['fields']):
-            if one_field['type'] == 'esriFieldTypeDate':
-                date_indexes.append(field_idx)
+        date_indexes = tuple(field_idx for field_idx, one_field in \
+                                enumerate(one_table.properties['fields']) \
+                                    if one_field['type'] == 'esriFieldTypeDate')
 
         for one_res in one_table.query('OBJECTID >= 0'):
             values, names = one_res.as_row
             names = (map_col_name((table_name,), one_name, opts['col_name_map'])
                                                                     for one_name in names)
             if date_indexes:
-                values = tuple(values)
-                values = tuple(datetime.utcfromtimestamp(int(values[cur_idx]/1000.0)) if cur_idx in \
-                            date_indexes else values[cur_idx] for cur_idx in range(0, len(values)))
+                values = list(values)
+                for cur_idx in date_indexes:
+                    values[cur_idx] = datetime.utcfromtimestamp(int(values[cur_idx]/1000.0))
             if process_esri_row(conn, table_name, tuple(names), tuple(values), opts, verbose):
                 added_updated_rows = added_updated_rows + 1
             else:
@@ -799,6 +998,12 @@ def load_excel_file(filepath: str, opts: dict) -> None:
         opts: additional options
     """
     verbose = 'verbose' in opts and opts['verbose']
+    num_workers = opts['workers'] if 'workers' in opts and opts['workers'] else 1
+
+    # Removing and restoring foreign key constraints needs to be done one table at a time
+    if num_workers > 1 and 'reset' in opts and opts['reset']:
+        opts['logger'].info('Loading sheets one at a time since tables are being reset')
+        num_workers = 1
 
     required_opts = ('host', 'database', 'password', 'user')
 
@@ -828,30 +1033,65 @@ def load_excel_file(filepath: str, opts: dict) -> None:
         opts['logger'].error('Please correct errors and try again')
         sys.exit(101)
 
-    # Set the default database EPSG
-    db_conn.epsg = opts['database_epsg']
-
-    # Open the EXCEL file and process each tab
-    if filepath:
-        workbook = load_workbook(filename=filepath, read_only=True, data_only=True)
+    # Make sure the connection is closed no matter how we leave
+    with db_conn:
+        # Set the default database EPSG
+        db_conn.epsg = opts['database_epsg']
 
-        opts['logger'].info(f'Updating using {filepath}')
-
-        for one_sheet in workbook.worksheets:
-            process_sheet(one_sheet, db_conn, opts)
-    else:
-        try:
-            process_esri_data(db_conn, opts['esri_endpoint'], opts['esri_client_id'],
-                                opts['esri_feature_id'], opts)
-        except ValueError as ex:
-            if verbose:
-                logging.getLogger().error('Value exception caught', exc_info=True, stack_info=True)
-                user_opts['logger'].error('Stopping processing due to detected problem')
-            else:
-                user_opts['logger'].error('Stopping processing due to detected problem. Use the ' \
-                                                            '--verbose flag for more information')
+        # Open the EXCEL file and process each tab
+        if filepath:
+            workbook = load_workbook(filename=filepath, read_only=True, data_only=True,
+                                     keep_links=False)
+            try:
+                opts['logger'].info(f'Updating using {filepath}')
+
+                if num_workers > 1:
+                    # Each worker process loads its sheets using its own workbook and connection
+                    sheet_names = workbook.sheetnames
+                    workbook.close()
+                    failed_sheets = []
+                    with ProcessPoolExecutor(max_workers=min(num_workers, len(sheet_names)),
+                                             initializer=init_worker_logging,
+                                             initargs=(opts['log_filename'], opts['debug'])) \
+                                                                                    as executor:
+                        sheet_futures = {executor.submit(process_sheet_file, filepath,
+                                                         one_name, opts): one_name
+                                                                    for one_name in sheet_names}
+                        for one_future in as_completed(sheet_futures):
+                            sheet_name = sheet_futures[one_future]
+                            try:
+                                one_future.result()
+                                opts['logger'].info(f'Committed sheet {sheet_name}')
+                            except Exception:
+                                opts['logger'].error(f'Unable to load sheet {sheet_name}',
+                                                     exc_info=True)
+                                failed_sheets.append(sheet_name)
+
+                    # The sheets that loaded have been committed
+                    if failed_sheets:
+                        opts['logger'].error('Sheets that failed to load: ' + \
+                                             ', '.join(failed_sheets))
+                        opts['logger'].error('The other sheets were loaded and committed')
+                        sys.exit(102)
+                else:
+                    for one_sheet in workbook.worksheets:
+                        process_sheet(one_sheet, db_conn, opts)
+            finally:
+                workbook.close()
+        else:
+            try:
+                process_esri_data(db_conn, opts['esri_endpoint'], opts['esri_client_id'],
+                                    opts['esri_feature_id'], opts)
+            except ValueError as ex:
+                if verbose:
+                    logging.getLogger().error('Value exception caught', exc_info=True,
+                                                                            stack_info=True)
+                    user_opts['logger'].error('Stopping processing due to detected problem')
+                else:
+                    user_opts['logger'].error('Stopping processing due to detected problem. ' \
+                                                        'Use the --verbose flag for more information')
 
-    db_conn.commit()
+        db_conn.commit()
 
 
 if __name__ == '__main__':